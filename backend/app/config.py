@@ -27,6 +27,11 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 días
     
+    # Costo de bcrypt: fijo si se define BCRYPT_ROUNDS; si no, se calibra al arrancar
+    # con el mayor costo que no pase de BCRYPT_TARGET_MS por hash
+    BCRYPT_ROUNDS: Optional[int] = None
+    BCRYPT_TARGET_MS: int = 250
+    
     # CORS (permite requests desde el frontend)
     ALLOWED_ORIGINS: list = [
         "http://localhost:3000",
@@ -44,6 +49,8 @@ class Settings(BaseSettings):
         "noreply@pyxolotl.com"
     )
     SENDGRID_FROM_NAME: str = "Pyxolotl"
+    # Plantilla dinámica de SendGrid para confirmaciones de compra (opcional)
+    SENDGRID_PURCHASE_TEMPLATE_ID: Optional[str] = os.getenv("SENDGRID_PURCHASE_TEMPLATE_ID")
     
     # Cloudinary (Almacenamiento de archivos)
     CLOUDINARY_CLOUD_NAME: Optional[str] = os.getenv("CLOUDINARY_CLOUD_NAME")
@@ -90,6 +97,8 @@ class Settings(BaseSettings):
     # Administrador inicial
     ADMIN_EMAIL: str = "sinuhevidals@gmail.com"
     ADMIN_PASSWORD: str = os.getenv("ADMIN_PASSWORD", "PyxolotlAdmin2025!")
+    # Hash bcrypt ya calculado de la contraseña (opcional, ej. en CI): evita hashear al crearlo
+    ADMIN_PASSWORD_HASH: Optional[str] = None
     
     class Config:
         env_file = ".env"
@@ -6,13 +6,17 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
+import orjson
 
 # Motor de base de datos
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,  # Verifica conexión antes de usar
     pool_recycle=3600,   # Recicla conexiones cada hora
-    echo=settings.DEBUG  # Muestra SQL queries en debug
+    echo=settings.DEBUG,  # Muestra SQL queries en debug
+    # Columnas JSON (screenshots_urls) con orjson en lugar de json de la stdlib
+    json_serializer=lambda obj: orjson.dumps(obj).decode(),
+    json_deserializer=orjson.loads
 )
 
 # Sesión de base de datos
@@ -0,0 +1,31 @@
+"""
+Enums compartidos por los modelos SQLAlchemy y los schemas Pydantic
+Python puro: importarlos no carga SQLAlchemy
+"""
+
+import enum
+
+class TipoCuenta(str, enum.Enum):
+    """Tipos de cuenta de usuario"""
+    COMPRADOR = "comprador"
+    DESARROLLADOR = "desarrollador"
+    ADMINISTRADOR = "administrador"
+
+class EstadoJuego(str, enum.Enum):
+    """Estados posibles de un juego"""
+    BORRADOR = "borrador"
+    EN_REVISION = "en_revision"
+    APROBADO = "aprobado"
+    RECHAZADO = "rechazado"
+
+class TipoDescarga(str, enum.Enum):
+    """Tipo de descarga del juego"""
+    ARCHIVO = "archivo"  # Archivo subido al servidor
+    LINK = "link"        # Link externo (Google Drive, etc.)
+
+class EstadoCompra(str, enum.Enum):
+    """Estados de una compra"""
+    PENDIENTE = "pendiente"
+    COMPLETADA = "completada"
+    CANCELADA = "cancelada"
+    REEMBOLSADA = "reembolsada"
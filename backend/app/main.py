@@ -4,11 +4,14 @@ Aplicación principal FastAPI - Pyxolotl Backend
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.base import BaseHTTPMiddleware
 from app.config import settings
 from app.database import engine, Base
 from app.routes import auth, juegos, compras, biblioteca, admin
+from app.utils.email import email_service
+from contextlib import asynccontextmanager
 import logging
 
 # Configurar logging
@@ -33,12 +36,20 @@ class HTTPSRedirectMiddleware(BaseHTTPMiddleware):
         response = await call_next(request)
         return response
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Cerrar conexiones abiertas con SendGrid
+    await email_service.close()
+
 # Crear aplicación FastAPI
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
     description="API para plataforma de videojuegos indie",
-    debug=settings.DEBUG
+    debug=settings.DEBUG,
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Agregar middleware de HTTPS primero
@@ -3,38 +3,14 @@ Modelos de base de datos - SQLAlchemy
 Define la estructura de todas las tablas en MySQL
 """
 
-from sqlalchemy import Column, Integer, String, Float, Text, Boolean, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, Text, Boolean, DateTime, ForeignKey, Enum, JSON, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
-import enum
-
-# ==================== ENUMS ====================
-
-class TipoCuenta(str, enum.Enum):
-    """Tipos de cuenta de usuario"""
-    COMPRADOR = "comprador"
-    DESARROLLADOR = "desarrollador"
-    ADMINISTRADOR = "administrador"
-
-class EstadoJuego(str, enum.Enum):
-    """Estados posibles de un juego"""
-    BORRADOR = "borrador"
-    EN_REVISION = "en_revision"
-    APROBADO = "aprobado"
-    RECHAZADO = "rechazado"
-
-class TipoDescarga(str, enum.Enum):
-    """Tipo de descarga del juego"""
-    ARCHIVO = "archivo"  # Archivo subido al servidor
-    LINK = "link"        # Link externo (Google Drive, etc.)
-
-class EstadoCompra(str, enum.Enum):
-    """Estados de una compra"""
-    PENDIENTE = "pendiente"
-    COMPLETADA = "completada"
-    CANCELADA = "cancelada"
-    REEMBOLSADA = "reembolsada"
+from datetime import datetime
+
+# Enums definidos en app.enums; se re-exportan aquí por compatibilidad
+from app.enums import TipoCuenta, EstadoJuego, TipoDescarga, EstadoCompra
 
 # ==================== MODELOS ====================
 
@@ -56,11 +32,12 @@ class Usuario(Base):
     
     # Relaciones
     juegos_publicados = relationship("Juego", back_populates="desarrollador", foreign_keys="Juego.desarrollador_id")
-    compras = relationship("Compra", back_populates="usuario")
-    resenas = relationship("Resena", back_populates="usuario")
-    carrito_items = relationship("CarritoItem", back_populates="usuario")
-    biblioteca_items = relationship("BibliotecaItem", back_populates="usuario")
-    descargas = relationship("DescargaLog", back_populates="usuario")
+    # passive_deletes: las filas hijas las borra MySQL (ON DELETE CASCADE), no el ORM
+    compras = relationship("Compra", back_populates="usuario", passive_deletes=True)
+    resenas = relationship("Resena", back_populates="usuario", passive_deletes=True)
+    carrito_items = relationship("CarritoItem", back_populates="usuario", passive_deletes=True)
+    biblioteca_items = relationship("BibliotecaItem", back_populates="usuario", passive_deletes=True)
+    descargas = relationship("DescargaLog", back_populates="usuario", passive_deletes=True)
 
 
 class Juego(Base):
@@ -76,7 +53,7 @@ class Juego(Base):
     
     # Archivos multimedia
     portada_url = Column(String(500), nullable=False)
-    screenshots_urls = Column(Text, nullable=True)  # JSON array de URLs
+    screenshots_urls = Column(JSON, nullable=True)  # Lista de URLs (columna JSON nativa)
     trailer_url = Column(String(500), nullable=True)
     
     # Archivo del juego
@@ -86,7 +63,7 @@ class Juego(Base):
     
     # Estado y aprobación
     estado = Column(Enum(EstadoJuego), default=EstadoJuego.EN_REVISION, index=True)
-    desarrollador_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
+    desarrollador_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False, index=True)
     aprobado_por_id = Column(Integer, ForeignKey("usuarios.id"), nullable=True)
     fecha_aprobacion = Column(DateTime(timezone=True), nullable=True)
     motivo_rechazo = Column(Text, nullable=True)
@@ -97,17 +74,18 @@ class Juego(Base):
     total_descargas = Column(Integer, default=0)
     total_ventas = Column(Integer, default=0)
     
+    # Default en Python además del server_default para no releer la fila tras el INSERT
     fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
     fecha_actualizacion = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relaciones
     desarrollador = relationship("Usuario", back_populates="juegos_publicados", foreign_keys=[desarrollador_id])
     aprobado_por = relationship("Usuario", foreign_keys=[aprobado_por_id])
-    resenas = relationship("Resena", back_populates="juego", cascade="all, delete-orphan")
-    items_compra = relationship("ItemCompra", back_populates="juego")
-    carrito_items = relationship("CarritoItem", back_populates="juego")
-    biblioteca_items = relationship("BibliotecaItem", back_populates="juego")
-    descargas = relationship("DescargaLog", back_populates="juego")
+    resenas = relationship("Resena", back_populates="juego", cascade="all, delete-orphan", passive_deletes=True)
+    items_compra = relationship("ItemCompra", back_populates="juego", passive_deletes=True)
+    carrito_items = relationship("CarritoItem", back_populates="juego", passive_deletes=True)
+    biblioteca_items = relationship("BibliotecaItem", back_populates="juego", passive_deletes=True)
+    descargas = relationship("DescargaLog", back_populates="juego", passive_deletes=True)
 
 
 class CarritoItem(Base):
@@ -115,8 +93,8 @@ class CarritoItem(Base):
     __tablename__ = "carrito_items"
     
     id = Column(Integer, primary_key=True, index=True)
-    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
-    juego_id = Column(Integer, ForeignKey("juegos.id"), nullable=False)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False, index=True)
+    juego_id = Column(Integer, ForeignKey("juegos.id", ondelete="CASCADE"), nullable=False)
     fecha_agregado = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relaciones
@@ -129,7 +107,7 @@ class Compra(Base):
     __tablename__ = "compras"
     
     id = Column(Integer, primary_key=True, index=True)
-    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False, index=True)
     
     subtotal = Column(Float, nullable=False)
     iva = Column(Float, nullable=False)
@@ -148,7 +126,7 @@ class Compra(Base):
     
     # Relaciones
     usuario = relationship("Usuario", back_populates="compras")
-    items = relationship("ItemCompra", back_populates="compra", cascade="all, delete-orphan")
+    items = relationship("ItemCompra", back_populates="compra", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class ItemCompra(Base):
@@ -156,8 +134,8 @@ class ItemCompra(Base):
     __tablename__ = "items_compra"
     
     id = Column(Integer, primary_key=True, index=True)
-    compra_id = Column(Integer, ForeignKey("compras.id"), nullable=False)
-    juego_id = Column(Integer, ForeignKey("juegos.id"), nullable=False)
+    compra_id = Column(Integer, ForeignKey("compras.id", ondelete="CASCADE"), nullable=False)
+    juego_id = Column(Integer, ForeignKey("juegos.id", ondelete="CASCADE"), nullable=False)
     precio = Column(Float, nullable=False)
     
     # Relaciones
@@ -170,8 +148,8 @@ class BibliotecaItem(Base):
     __tablename__ = "biblioteca_items"
     
     id = Column(Integer, primary_key=True, index=True)
-    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
-    juego_id = Column(Integer, ForeignKey("juegos.id"), nullable=False)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False, index=True)
+    juego_id = Column(Integer, ForeignKey("juegos.id", ondelete="CASCADE"), nullable=False)
     
     fecha_obtencion = Column(DateTime(timezone=True), server_default=func.now())
     es_gratuito = Column(Boolean, default=False)
@@ -184,10 +162,14 @@ class BibliotecaItem(Base):
 class Resena(Base):
     """Reseñas de juegos"""
     __tablename__ = "resenas"
+    __table_args__ = (
+        # Un usuario solo puede dejar una reseña por juego
+        UniqueConstraint("usuario_id", "juego_id", name="uq_resena_user_juego"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
-    juego_id = Column(Integer, ForeignKey("juegos.id"), nullable=False)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
+    juego_id = Column(Integer, ForeignKey("juegos.id", ondelete="CASCADE"), nullable=False)
     
     calificacion = Column(Integer, nullable=False)  # 1-5 estrellas
     texto = Column(Text, nullable=False)
@@ -205,8 +187,8 @@ class DescargaLog(Base):
     __tablename__ = "descargas_log"
     
     id = Column(Integer, primary_key=True, index=True)
-    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
-    juego_id = Column(Integer, ForeignKey("juegos.id"), nullable=False)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False, index=True)
+    juego_id = Column(Integer, ForeignKey("juegos.id", ondelete="CASCADE"), nullable=False)
     
     fecha_descarga = Column(DateTime(timezone=True), server_default=func.now())
     ip_address = Column(String(50), nullable=True)
@@ -221,7 +203,7 @@ class TokenVerificacion(Base):
     __tablename__ = "tokens_verificacion"
     
     id = Column(Integer, primary_key=True, index=True)
-    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False, index=True)
     
     token = Column(String(255), unique=True, nullable=False, index=True)
     tipo = Column(String(50), nullable=False)  # 'email' o 'password_reset'
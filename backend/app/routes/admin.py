@@ -6,12 +6,12 @@ Requiere autenticación como administrador.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, load_only, selectinload
+from typing import Dict, List, Optional
+from datetime import datetime
 from pydantic import BaseModel
-import json
 import os
-import re
 
 from app.database import get_db
 from app.models import (
@@ -19,11 +19,11 @@ from app.models import (
     CarritoItem, BibliotecaItem, DescargaLog, ItemCompra
 )
 from app.dependencies import get_current_active_user
+from app.utils.files import file_service
 
 # Cloudinary (opcional)
 try:
     import cloudinary
-    import cloudinary.uploader
     CLOUDINARY_ENABLED = bool(os.getenv("CLOUDINARY_CLOUD_NAME"))
 except ImportError:
     CLOUDINARY_ENABLED = False
@@ -82,67 +82,58 @@ def verificar_admin(user: Usuario):
     if not (is_admin_by_type or is_admin_by_email):
         raise HTTPException(status_code=403, detail="No tienes permisos de administrador")
 
-def extract_public_id(url: str) -> Optional[str]:
-    """Extrae el public_id de una URL de Cloudinary"""
-    if not url or "cloudinary" not in url:
-        return None
-    
-    try:
-        pattern = r'/upload/(?:v\d+/)?(.+?)(?:\.\w+)?$'
-        match = re.search(pattern, url)
-        if match:
-            public_id = match.group(1)
-            return re.sub(r'\.\w+$', '', public_id)
-        return None
-    except:
-        return None
+# Columnas de Juego que archivos_juego necesita
+COLUMNAS_ARCHIVOS = (Juego.portada_url, Juego.screenshots_urls, Juego.trailer_url, Juego.archivo_juego_url)
 
-def delete_cloudinary_resource(url: str, resource_type: str = "image") -> bool:
-    """Elimina un recurso de Cloudinary"""
+def archivos_juego(juego: Juego) -> List[str]:
+    """
+    Reúne las URLs de Cloudinary de un juego
+    No elimina nada: el llamador junta las de varios juegos y las borra en lote
+    """
+    urls = [juego.portada_url, *(juego.screenshots_urls or []), juego.trailer_url, juego.archivo_juego_url]
+    return [url for url in urls if url and "cloudinary" in url]
+
+async def eliminar_archivos(urls: List[str]) -> int:
+    """
+    Elimina de Cloudinary las URLs acumuladas
+    delete_many obtiene el resource_type de cada URL y hace una llamada
+    a delete_resources por cada 100 public_ids de un mismo tipo
+    """
     if not CLOUDINARY_ENABLED:
-        return False
+        return 0
     
-    public_id = extract_public_id(url)
-    if not public_id:
-        return False
-    
-    try:
-        result = cloudinary.uploader.destroy(
-            public_id,
-            resource_type=resource_type,
-            invalidate=True
-        )
-        return result.get("result") == "ok"
-    except:
-        return False
+    return await file_service.delete_many(urls)
+
+def relaciones_juegos(juegos_ids: List[int]) -> Dict[str, tuple]:
+    """Filas que dependen de los juegos dados (las que borra la cascada)"""
+    return {
+        "resenas": (Resena, Resena.juego_id.in_(juegos_ids)),
+        "items_compra": (ItemCompra, ItemCompra.juego_id.in_(juegos_ids)),
+        "carrito": (CarritoItem, CarritoItem.juego_id.in_(juegos_ids)),
+        "biblioteca": (BibliotecaItem, BibliotecaItem.juego_id.in_(juegos_ids)),
+        "descargas": (DescargaLog, DescargaLog.juego_id.in_(juegos_ids))
+    }
 
-def eliminar_archivos_juego(juego: Juego) -> int:
-    """Elimina los archivos de Cloudinary de un juego"""
-    eliminados = 0
-    
-    if juego.portada_url and "cloudinary" in juego.portada_url:
-        if delete_cloudinary_resource(juego.portada_url):
-            eliminados += 1
-    
-    if juego.screenshots_urls:
-        try:
-            screenshots = json.loads(juego.screenshots_urls) if isinstance(juego.screenshots_urls, str) else juego.screenshots_urls
-            for url in screenshots:
-                if url and "cloudinary" in url:
-                    if delete_cloudinary_resource(url):
-                        eliminados += 1
-        except:
-            pass
-    
-    if juego.trailer_url and "cloudinary" in juego.trailer_url:
-        if delete_cloudinary_resource(juego.trailer_url, "video"):
-            eliminados += 1
-    
-    if juego.archivo_juego_url and "cloudinary" in juego.archivo_juego_url:
-        if delete_cloudinary_resource(juego.archivo_juego_url, "raw"):
-            eliminados += 1
-    
-    return eliminados
+def relaciones_usuario(user_id: int) -> Dict[str, tuple]:
+    """Filas que dependen de un usuario (las que borra la cascada)"""
+    compras_ids = select(Compra.id).where(Compra.usuario_id == user_id)
+    return {
+        "tokens": (TokenVerificacion, TokenVerificacion.usuario_id == user_id),
+        "resenas": (Resena, Resena.usuario_id == user_id),
+        "carrito": (CarritoItem, CarritoItem.usuario_id == user_id),
+        "biblioteca": (BibliotecaItem, BibliotecaItem.usuario_id == user_id),
+        "descargas": (DescargaLog, DescargaLog.usuario_id == user_id),
+        "items_compra": (ItemCompra, ItemCompra.compra_id.in_(compras_ids)),
+        "compras": (Compra, Compra.usuario_id == user_id)
+    }
+
+def contar_registros(db: Session, relaciones: Dict[str, tuple]) -> int:
+    """Total de filas de varias relaciones, con un solo SELECT de subconsultas COUNT"""
+    columnas = [
+        select(func.count()).select_from(modelo).where(condicion).scalar_subquery().label(nombre)
+        for nombre, (modelo, condicion) in relaciones.items()
+    ]
+    return sum(db.execute(select(*columnas)).one())
 
 # ==================== ENDPOINTS ====================
 
@@ -174,7 +165,21 @@ async def listar_usuarios(
     """Lista todos los usuarios"""
     verificar_admin(current_user)
     
-    query = db.query(Usuario)
+    # Conteos como subconsultas correlacionadas: una sola consulta para toda la página
+    num_juegos = (
+        select(func.count(Juego.id))
+        .where(Juego.desarrollador_id == Usuario.id)
+        .correlate(Usuario)
+        .scalar_subquery()
+    )
+    num_compras = (
+        select(func.count(Compra.id))
+        .where(Compra.usuario_id == Usuario.id)
+        .correlate(Usuario)
+        .scalar_subquery()
+    )
+    
+    query = db.query(Usuario, num_juegos, num_compras)
     
     if verificado is not None:
         query = query.filter(Usuario.verificado == verificado)
@@ -182,15 +187,15 @@ async def listar_usuarios(
     usuarios = query.offset(skip).limit(limit).all()
     
     result = []
-    for user in usuarios:
+    for user, juegos, compras in usuarios:
         result.append(UsuarioAdmin(
             id=user.id,
             nombre=user.nombre,
             email=user.email,
             tipo_cuenta=user.tipo_cuenta,
             verificado=user.verificado,
-            num_juegos=db.query(Juego).filter(Juego.desarrollador_id == user.id).count(),
-            num_compras=db.query(Compra).filter(Compra.usuario_id == user.id).count()
+            num_juegos=juegos,
+            num_compras=compras
         ))
     
     return result
@@ -207,7 +212,8 @@ async def listar_juegos_admin(
     """Lista todos los juegos"""
     verificar_admin(current_user)
     
-    query = db.query(Juego)
+    # Desarrolladores en un solo SELECT ... IN en vez de uno por juego
+    query = db.query(Juego).options(selectinload(Juego.desarrollador))
     
     if estado:
         query = query.filter(Juego.estado == estado)
@@ -240,14 +246,9 @@ async def eliminar_juego(
     """
     Elimina un juego específico con todas sus relaciones.
     
-    Orden de eliminación:
-    1. Reseñas
-    2. Items de compra
-    3. Items de carrito
-    4. Items de biblioteca
-    5. Registros de descarga
-    6. Archivos en Cloudinary
-    7. El juego
+    Reseñas, items de compra, carrito, biblioteca y registros de descarga
+    se eliminan en MySQL por ON DELETE CASCADE al borrar el juego.
+    Los archivos de Cloudinary se eliminan al final, en lote.
     """
     verificar_admin(current_user)
     
@@ -256,37 +257,22 @@ async def eliminar_juego(
     if not juego:
         raise HTTPException(status_code=404, detail="Juego no encontrado")
     
-    registros = 0
     titulo = juego.titulo
     
     try:
-        # 1. Eliminar reseñas
-        count = db.query(Resena).filter(Resena.juego_id == juego_id).delete()
-        registros += count
-        
-        # 2. Eliminar items de compra
-        count = db.query(ItemCompra).filter(ItemCompra.juego_id == juego_id).delete()
-        registros += count
-        
-        # 3. Eliminar items de carrito
-        count = db.query(CarritoItem).filter(CarritoItem.juego_id == juego_id).delete()
-        registros += count
-        
-        # 4. Eliminar items de biblioteca
-        count = db.query(BibliotecaItem).filter(BibliotecaItem.juego_id == juego_id).delete()
-        registros += count
+        # Registros que arrastra la cascada (una sola consulta)
+        registros = contar_registros(db, relaciones_juegos([juego_id]))
         
-        # 5. Eliminar registros de descarga
-        count = db.query(DescargaLog).filter(DescargaLog.juego_id == juego_id).delete()
-        registros += count
+        # Reunir archivos de Cloudinary antes de perder la fila
+        urls = archivos_juego(juego)
         
-        # 6. Eliminar archivos de Cloudinary
-        archivos = eliminar_archivos_juego(juego)
-        
-        # 7. Eliminar el juego
-        db.delete(juego)
+        # El juego; sus hijos los elimina la base de datos
+        db.query(Juego).filter(Juego.id == juego_id).delete(synchronize_session=False)
         db.commit()
         
+        # Los archivos se borran en lote una vez confirmada la transacción
+        archivos = await eliminar_archivos(urls)
+        
         return DeleteResponse(
             success=True,
             message=f"Juego '{titulo}' eliminado correctamente",
@@ -308,17 +294,10 @@ async def eliminar_usuario(
     """
     Elimina un usuario con todas sus relaciones.
     
-    Orden de eliminación:
-    1. Tokens de verificación
-    2. Reseñas del usuario
-    3. Items de carrito
-    4. Items de biblioteca
-    5. Registros de descarga
-    6. Items de compra
-    7. Compras
-    8. Juegos publicados (opcional)
-    9. Avatar en Cloudinary
-    10. El usuario
+    Tokens, reseñas, carrito, biblioteca, descargas y compras (con sus items)
+    se eliminan en MySQL por ON DELETE CASCADE al borrar el usuario.
+    Los juegos publicados (opcional) se borran con un solo DELETE, también
+    en cascada. Los archivos de Cloudinary y el avatar se eliminan al final, en lote.
     """
     verificar_admin(current_user)
     
@@ -331,65 +310,37 @@ async def eliminar_usuario(
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
-    registros = 0
-    archivos = 0
+    urls: List[str] = []
     nombre = usuario.nombre
     
     try:
-        # 1. Tokens
-        count = db.query(TokenVerificacion).filter(TokenVerificacion.usuario_id == user_id).delete()
-        registros += count
-        
-        # 2. Reseñas del usuario
-        count = db.query(Resena).filter(Resena.usuario_id == user_id).delete()
-        registros += count
+        # Registros que arrastra la cascada (una sola consulta)
+        registros = contar_registros(db, relaciones_usuario(user_id))
         
-        # 3. Items de carrito
-        count = db.query(CarritoItem).filter(CarritoItem.usuario_id == user_id).delete()
-        registros += count
-        
-        # 4. Items de biblioteca
-        count = db.query(BibliotecaItem).filter(BibliotecaItem.usuario_id == user_id).delete()
-        registros += count
-        
-        # 5. Registros de descarga
-        count = db.query(DescargaLog).filter(DescargaLog.usuario_id == user_id).delete()
-        registros += count
-        
-        # 6-7. Compras y sus items
-        compras = db.query(Compra).filter(Compra.usuario_id == user_id).all()
-        for compra in compras:
-            db.query(ItemCompra).filter(ItemCompra.compra_id == compra.id).delete()
-            registros += 1
-        count = db.query(Compra).filter(Compra.usuario_id == user_id).delete()
-        registros += count
-        
-        # 8. Juegos publicados
+        # Juegos publicados
         if eliminar_juegos:
-            juegos = db.query(Juego).filter(Juego.desarrollador_id == user_id).all()
+            juegos = (
+                db.query(Juego)
+                .filter(Juego.desarrollador_id == user_id)
+                .options(load_only(*COLUMNAS_ARCHIVOS))
+                .all()
+            )
             for juego in juegos:
-                # Eliminar relaciones del juego
-                db.query(Resena).filter(Resena.juego_id == juego.id).delete()
-                db.query(ItemCompra).filter(ItemCompra.juego_id == juego.id).delete()
-                db.query(CarritoItem).filter(CarritoItem.juego_id == juego.id).delete()
-                db.query(BibliotecaItem).filter(BibliotecaItem.juego_id == juego.id).delete()
-                db.query(DescargaLog).filter(DescargaLog.juego_id == juego.id).delete()
-                
-                # Eliminar archivos
-                archivos += eliminar_archivos_juego(juego)
-                
-                db.delete(juego)
-                registros += 1
+                urls.extend(archivos_juego(juego))
+            
+            db.query(Juego).filter(Juego.desarrollador_id == user_id).delete(synchronize_session=False)
+            registros += len(juegos)
         
-        # 9. Avatar
+        # Avatar
         if usuario.avatar_url and "cloudinary" in usuario.avatar_url:
-            if delete_cloudinary_resource(usuario.avatar_url):
-                archivos += 1
+            urls.append(usuario.avatar_url)
         
-        # 10. El usuario
-        db.delete(usuario)
+        # El usuario
+        db.query(Usuario).filter(Usuario.id == user_id).delete(synchronize_session=False)
         db.commit()
         
+        archivos = await eliminar_archivos(urls)
+        
         return DeleteResponse(
             success=True,
             message=f"Usuario '{nombre}' eliminado correctamente",
@@ -427,27 +378,21 @@ async def eliminar_juegos_usuario(
             archivos_eliminados=0
         )
     
-    registros = 0
-    archivos = 0
+    urls: List[str] = []
     
     try:
+        juegos_ids = [juego.id for juego in juegos]
+        registros = contar_registros(db, relaciones_juegos(juegos_ids))
+        
         for juego in juegos:
-            # Eliminar relaciones
-            registros += db.query(Resena).filter(Resena.juego_id == juego.id).delete()
-            registros += db.query(ItemCompra).filter(ItemCompra.juego_id == juego.id).delete()
-            registros += db.query(CarritoItem).filter(CarritoItem.juego_id == juego.id).delete()
-            registros += db.query(BibliotecaItem).filter(BibliotecaItem.juego_id == juego.id).delete()
-            registros += db.query(DescargaLog).filter(DescargaLog.juego_id == juego.id).delete()
-            
-            # Eliminar archivos
-            archivos += eliminar_archivos_juego(juego)
-            
-            # Eliminar juego
-            db.delete(juego)
-            registros += 1
+            urls.extend(archivos_juego(juego))
         
+        # Un solo DELETE; las relaciones de cada juego caen en cascada
+        registros += db.query(Juego).filter(Juego.id.in_(juegos_ids)).delete(synchronize_session=False)
         db.commit()
         
+        archivos = await eliminar_archivos(urls)
+        
         return DeleteResponse(
             success=True,
             message=f"{len(juegos)} juegos de '{usuario.nombre}' eliminados",
@@ -477,25 +422,19 @@ async def limpiar_usuarios_no_verificados(
             archivos_eliminados=0
         )
     
-    registros = 0
-    archivos = 0
+    usuarios_ids = [user.id for user in usuarios]
+    avatares = [user.avatar_url for user in usuarios if user.avatar_url and "cloudinary" in user.avatar_url]
     
     try:
-        for user in usuarios:
-            # Eliminar tokens
-            registros += db.query(TokenVerificacion).filter(TokenVerificacion.usuario_id == user.id).delete()
-            
-            # Eliminar avatar
-            if user.avatar_url and "cloudinary" in user.avatar_url:
-                if delete_cloudinary_resource(user.avatar_url):
-                    archivos += 1
-            
-            # Eliminar usuario
-            db.delete(user)
-            registros += 1
-        
+        # Tokens (y cualquier otra fila del usuario) caen en cascada
+        registros = contar_registros(db, {
+            "tokens": (TokenVerificacion, TokenVerificacion.usuario_id.in_(usuarios_ids))
+        })
+        registros += db.query(Usuario).filter(Usuario.id.in_(usuarios_ids)).delete(synchronize_session=False)
         db.commit()
         
+        archivos = await eliminar_archivos({"image": avatares})
+        
         return DeleteResponse(
             success=True,
             message=f"{len(usuarios)} usuarios no verificados eliminados",
@@ -506,3 +445,31 @@ async def limpiar_usuarios_no_verificados(
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error al eliminar: {str(e)}")
+
+@router.delete("/tokens/expirados", response_model=DeleteResponse)
+async def limpiar_tokens_expirados(
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_active_user)
+):
+    """
+    Elimina los tokens de verificación y recuperación ya expirados.
+    La comparación de fechas la hace MySQL en un solo DELETE, sin cargar los tokens.
+    """
+    verificar_admin(current_user)
+    
+    try:
+        registros = db.query(TokenVerificacion).filter(
+            TokenVerificacion.fecha_expiracion < datetime.utcnow()
+        ).delete(synchronize_session=False)
+        db.commit()
+        
+        return DeleteResponse(
+            success=True,
+            message=f"{registros} tokens expirados eliminados",
+            registros_eliminados=registros,
+            archivos_eliminados=0
+        )
+        
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error al eliminar: {str(e)}")
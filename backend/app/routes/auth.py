@@ -108,7 +108,7 @@ async def registrar_usuario(
     # Enviar email de verificación
     logger.warning(f"🔔 INTENTANDO ENVIAR EMAIL DE VERIFICACIÓN a {new_user.email}")
     try:
-        result = email_service.send_verification_email(
+        result = await email_service.send_verification_email(
             new_user.email,
             new_user.nombre,
             verification_token
@@ -2,13 +2,13 @@
 Rutas de biblioteca y descargas
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session, joinedload
 from typing import List
 from app.database import get_db
 from app.models import Usuario, BibliotecaItem, Juego, DescargaLog, TipoDescarga
-from app.schemas import BibliotecaItemResponse
+from app.schemas import BibliotecaItemResponse, dump_fast
 from app.dependencies import get_current_active_user
 import os
 
@@ -25,7 +25,7 @@ async def obtener_biblioteca(
     ).filter(
         BibliotecaItem.usuario_id == current_user.id
     ).all()
-    return items
+    return Response(dump_fast(BibliotecaItemResponse, items), media_type="application/json")
 
 @router.get("/descargar/{juego_id}")
 async def descargar_juego(
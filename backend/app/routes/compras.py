@@ -2,13 +2,13 @@
 Rutas de compras y carrito
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
 from app.database import get_db
 from app.models import Usuario, Juego, CarritoItem, Compra, ItemCompra, BibliotecaItem, EstadoCompra, EstadoJuego
-from app.schemas import CompraCreate, CompraResponse, CarritoItemResponse, Message
+from app.schemas import CompraCreate, CompraResponse, CarritoItemResponse, Message, dump_fast
 from app.dependencies import get_current_active_user
 from app.utils.email import email_service
 from app.config import settings
@@ -64,7 +64,7 @@ async def obtener_carrito(
 ):
     """Obtiene el carrito del usuario"""
     items = db.query(CarritoItem).filter(CarritoItem.usuario_id == current_user.id).all()
-    return items
+    return Response(dump_fast(CarritoItemResponse, items), media_type="application/json")
 
 @router.delete("/carrito/{item_id}", response_model=Message)
 async def eliminar_del_carrito(
@@ -217,7 +217,7 @@ async def procesar_compra(
     
     # Enviar email
     juegos_email = [{"titulo": j.titulo, "precio": j.precio} for j in juegos]
-    email_service.send_purchase_confirmation(
+    await email_service.send_purchase_confirmation(
         current_user.email,
         current_user.nombre,
         numero_orden,
@@ -318,7 +318,7 @@ async def confirmar_compra_stripe(
     
     # Enviar email
     juegos_email = [{"titulo": j.titulo, "precio": j.precio} for j in juegos]
-    email_service.send_purchase_confirmation(
+    await email_service.send_purchase_confirmation(
         current_user.email,
         current_user.nombre,
         numero_orden,
@@ -337,4 +337,4 @@ async def obtener_historial_compras(
 ):
     """Obtiene el historial de compras del usuario"""
     compras = db.query(Compra).filter(Compra.usuario_id == current_user.id).all()
-    return compras
\ No newline at end of file
+    return Response(dump_fast(CompraResponse, compras), media_type="application/json")
\ No newline at end of file
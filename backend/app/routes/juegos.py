@@ -3,18 +3,25 @@ Rutas de juegos
 Publicar, buscar, filtrar, aprobar/rechazar juegos
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, func
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request, Response
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import or_, and_, func, select
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Tuple
 from app.database import get_db
 from app.models import Usuario, Juego, EstadoJuego, TipoDescarga, BibliotecaItem
 from app.schemas import (
     JuegoResponse,
     JuegoListResponse,
     JuegosFiltros,
+    OrdenarPor,
+    Orden,
     JuegoApproval,
-    Message
+    Message,
+    FirmaSubida,
+    ArchivoSubido,
+    dump_fast,
+    dump_validated
 )
 from app.dependencies import (
     get_current_developer,
@@ -22,8 +29,10 @@ from app.dependencies import (
     get_current_user_optional,
     get_current_active_user
 )
-from app.utils.files import file_service
+from app.utils.files import file_service, ArchivoMuyGrande, TipoArchivoInvalido
 from app.utils.email import email_service
+from app.config import settings
+import hashlib
 import json
 import logging
 
@@ -31,8 +40,139 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/juegos", tags=["Juegos"])
 
+# Tiempo que navegador/CDN pueden reutilizar respuestas públicas de juegos
+PUBLIC_CACHE_CONTROL = "public, max-age=60"
+
+# ==================== CACHE HTTP (ETag) ====================
+
+def _juego_version(juego_id: int, fecha_creacion, fecha_actualizacion) -> str:
+    """Identificador de versión de un juego: su ID y última modificación"""
+    modificado = fecha_actualizacion or fecha_creacion
+    return f"{juego_id}:{modificado.timestamp() if modificado else 0}"
+
+def _usuario_version(usuario: Optional[Usuario]) -> str:
+    """Versión del desarrollador incluido en el detalle de un juego (nombre, avatar, etc.)"""
+    if usuario is None:
+        return "-"
+    modificado = usuario.fecha_actualizacion or usuario.fecha_registro
+    return f"u{usuario.id}:{modificado.timestamp() if modificado else 0}"
+
+def _etag(*versiones: str) -> str:
+    """Calcula un ETag a partir de las versiones de los juegos incluidos"""
+    return '"' + hashlib.md5("|".join(versiones).encode()).hexdigest() + '"'
+
+def _cache_headers(etag: str) -> dict:
+    """Headers de cache HTTP para respuestas públicas de juegos"""
+    return {"Cache-Control": PUBLIC_CACHE_CONTROL, "ETag": etag}
+
+def _not_modified(request: Request, headers: dict) -> Optional[Response]:
+    """Si el cliente ya tiene esta versión (If-None-Match), devuelve un 304 sin cuerpo"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and headers["ETag"] in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return None
+
 # ==================== PUBLICAR JUEGO (Desarrollador) ====================
 
+def _carpeta_archivos(usuario: Usuario) -> str:
+    """Carpeta de Cloudinary para las subidas directas de un desarrollador"""
+    return f"pyxolotl/juegos/dev_{usuario.id}/archivos"
+
+async def _validar_archivo_subido(archivo: ArchivoSubido, usuario: Usuario) -> Tuple[str, float]:
+    """
+    Valida la respuesta de una subida directa a Cloudinary
+    El tamaño y el formato se consultan a Cloudinary; los que envía el cliente no se usan
+    
+    Returns:
+        Tupla (URL, tamaño en MB)
+    """
+    if not settings.CLOUDINARY_CLOUD_NAME:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="La subida directa requiere Cloudinary"
+        )
+    
+    if not file_service.verify_direct_upload(
+        archivo.public_id,
+        archivo.version,
+        archivo.signature,
+        archivo.secure_url,
+        _carpeta_archivos(usuario)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La subida del archivo del juego no es válida"
+        )
+    
+    try:
+        tamano_mb = await file_service.check_direct_upload(
+            archivo.public_id,
+            archivo.secure_url,
+            settings.MAX_GAME_SIZE_MB,
+            settings.ALLOWED_GAME_FORMATS,
+            "Formato de archivo de juego"
+        )
+    except ArchivoMuyGrande as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except TipoArchivoInvalido as e:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=str(e)
+        )
+    
+    return archivo.secure_url, tamano_mb
+
+@router.post("/archivo/firma", response_model=FirmaSubida)
+async def firmar_subida_archivo(
+    current_user: Usuario = Depends(get_current_developer)
+):
+    """
+    Firma la subida directa del archivo del juego a Cloudinary
+    El navegador sube el archivo sin pasar por el backend y luego envía
+    la respuesta de Cloudinary a /publicar (archivo_subido) o a PUT /{juego_id}/archivo
+    """
+    if not settings.CLOUDINARY_CLOUD_NAME:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="La subida directa requiere Cloudinary"
+        )
+    
+    return file_service.sign_upload(_carpeta_archivos(current_user), "raw")
+
+@router.put("/{juego_id}/archivo", response_model=Message)
+async def registrar_archivo_juego(
+    juego_id: int,
+    archivo: ArchivoSubido,
+    current_user: Usuario = Depends(get_current_developer),
+    db: Session = Depends(get_db)
+):
+    """Registra el archivo de un juego subido directamente a Cloudinary"""
+    
+    juego = db.query(Juego).filter(Juego.id == juego_id).first()
+    
+    if not juego:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Juego no encontrado"
+        )
+    
+    if juego.desarrollador_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No puedes modificar este juego"
+        )
+    
+    juego.archivo_juego_url, juego.tamano_mb = await _validar_archivo_subido(archivo, current_user)
+    juego.tipo_descarga = TipoDescarga.ARCHIVO
+    db.commit()
+    
+    logger.info(f"Archivo del juego {juego_id} registrado: {juego.archivo_juego_url}")
+    
+    return {"message": "Archivo del juego registrado", "success": True}
+
 @router.post("/publicar", response_model=JuegoResponse, status_code=status.HTTP_201_CREATED)
 async def publicar_juego(
     titulo: str = Form(...),
@@ -47,6 +187,7 @@ async def publicar_juego(
     screenshots: List[UploadFile] = File(...),
     trailer: Optional[UploadFile] = File(None),
     archivo_juego: Optional[UploadFile] = File(None),
+    archivo_subido: Optional[str] = Form(None),  # JSON de ArchivoSubido (subida directa)
     
     current_user: Usuario = Depends(get_current_developer),
     db: Session = Depends(get_db)
@@ -59,7 +200,17 @@ async def publicar_juego(
         archivo_juego_url = None
         tamano_mb = None
         
-        if tipo_descarga == "archivo":
+        if tipo_descarga == "archivo" and archivo_subido:
+            # El navegador ya subió el archivo a Cloudinary con /archivo/firma
+            try:
+                archivo = ArchivoSubido.model_validate_json(archivo_subido)
+            except ValueError:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Datos de la subida del archivo inválidos"
+                )
+            archivo_juego_url, tamano_mb = await _validar_archivo_subido(archivo, current_user)
+        elif tipo_descarga == "archivo":
             if not archivo_juego:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -84,38 +235,18 @@ async def publicar_juego(
         import time
         temp_id = f"temp_{current_user.id}_{int(time.time())}"
         
-        # Guardar portada
-        logger.info(f"Subiendo portada para juego temporal {temp_id}")
-        portada_url = await file_service.save_image(portada, None, "portada")
-        
-        # Guardar screenshots
-        screenshots_urls = []
-        for idx, screenshot in enumerate(screenshots):
-            # Verificar que el screenshot tenga contenido
-            if screenshot.size and screenshot.size > 0:
-                url = await file_service.save_image(screenshot, None, f"screenshot_{idx}")
-                screenshots_urls.append(url)
+        # Portada, screenshots, trailer y archivo del juego se suben en paralelo
+        logger.info(f"Subiendo archivos para juego temporal {temp_id}")
+        portada_url, screenshots_urls, trailer_url, archivo_resultado = await file_service.save_game_assets(
+            portada,
+            screenshots,
+            trailer,
+            archivo_juego if tipo_descarga == "archivo" and not archivo_juego_url else None
+        )
         
-        # Guardar trailer si existe
-        trailer_url = None
-        if trailer and trailer.size and trailer.size > 0:
-            logger.info(f"Subiendo trailer para juego temporal {temp_id}")
-            trailer_url = await file_service.save_video(trailer, 0)
-        
-        # Guardar archivo del juego si es tipo archivo
-        if tipo_descarga == "archivo" and archivo_juego:
-            logger.info(f"Subiendo archivo del juego para {temp_id}")
-            try:
-                game_url, size_mb = await file_service.save_game_file(archivo_juego, 0)
-                archivo_juego_url = game_url
-                tamano_mb = size_mb
-                logger.info(f"Archivo del juego subido exitosamente: {game_url}")
-            except Exception as upload_error:
-                logger.error(f"Error al subir archivo del juego: {str(upload_error)}")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Error al subir el archivo del juego: {str(upload_error)}"
-                )
+        if archivo_resultado:
+            archivo_juego_url, tamano_mb = archivo_resultado
+            logger.info(f"Archivo del juego subido exitosamente: {archivo_juego_url}")
         
         # ========== VERIFICAR QUE TENEMOS URL DEL ARCHIVO ==========
         if not archivo_juego_url:
@@ -134,24 +265,40 @@ async def publicar_juego(
             desarrollador_id=current_user.id,
             estado=EstadoJuego.EN_REVISION,
             portada_url=portada_url,
-            screenshots_urls=json.dumps(screenshots_urls) if screenshots_urls else None,
+            screenshots_urls=screenshots_urls or None,
             trailer_url=trailer_url,
             tipo_descarga=TipoDescarga(tipo_descarga),
             archivo_juego_url=archivo_juego_url,
             tamano_mb=tamano_mb
         )
         
+        # El desarrollador ya está cargado en la sesión; evita un lazy load al serializar
+        new_game.desarrollador = current_user
+        
+        # La respuesta se arma tras el flush y antes del commit (que expira el objeto):
+        # solo fecha_creacion (server_default) se lee de la BD, el resto ya está en el objeto
         db.add(new_game)
+        db.flush()
+        respuesta = JuegoResponse.from_orm_fast(new_game)
         db.commit()
-        db.refresh(new_game)
         
-        logger.info(f"Juego publicado exitosamente: {titulo} (ID: {new_game.id}) por {current_user.email}")
+        logger.info(f"Juego publicado exitosamente: {titulo} (ID: {respuesta.id}) por {current_user.email}")
         
-        return new_game
+        return respuesta
         
     except HTTPException:
         # Re-lanzar excepciones HTTP sin modificar
         raise
+    except ArchivoMuyGrande as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except TipoArchivoInvalido as e:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=str(e)
+        )
     except Exception as e:
         db.rollback()
         logger.error(f"Error al publicar juego: {str(e)}")
@@ -164,25 +311,42 @@ async def publicar_juego(
 
 @router.get("/catalogo", response_model=List[JuegoListResponse])
 async def obtener_catalogo(
+    request: Request,
     busqueda: Optional[str] = None,
     genero: Optional[str] = None,
     precio_min: Optional[float] = None,
     precio_max: Optional[float] = None,
     solo_gratuitos: bool = False,
-    ordenar_por: str = "fecha_creacion",
-    orden: str = "desc",
-    pagina: int = 1,
-    por_pagina: int = 20,
+    ordenar_por: OrdenarPor = "fecha_creacion",
+    orden: Orden = "desc",
+    pagina: int = Query(1, ge=1),
+    por_pagina: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
     db: Session = Depends(get_db),
     current_user: Optional[Usuario] = Depends(get_current_user_optional)
 ):
     """
     Obtiene el catálogo de juegos aprobados
     Soporta búsqueda, filtros y paginación
+    El header X-Has-Next indica si existe una página siguiente
+    Responde 304 si el cliente ya tiene la misma página (ETag)
     """
     
     # Base query: solo juegos aprobados
-    query = db.query(Juego).filter(Juego.estado == EstadoJuego.APROBADO)
+    # Select de columnas (Core) en lugar de entidades ORM: la respuesta solo
+    # se serializa, así que no hace falta hidratar objetos Juego
+    query = select(
+        Juego.id,
+        Juego.titulo,
+        Juego.descripcion,
+        Juego.genero,
+        Juego.precio,
+        Juego.portada_url,
+        Juego.calificacion_promedio,
+        Juego.total_resenas,
+        Juego.estado,
+        Juego.fecha_creacion,
+        Juego.fecha_actualizacion
+    ).where(Juego.estado == EstadoJuego.APROBADO)
     
     # Aplicar filtros
     if busqueda:
@@ -190,19 +354,24 @@ async def obtener_catalogo(
             Juego.titulo.ilike(f"%{busqueda}%"),
             Juego.descripcion.ilike(f"%{busqueda}%")
         )
-        query = query.filter(search_filter)
+        query = query.where(search_filter)
     
     if genero:
-        query = query.filter(Juego.genero == genero)
-    
-    if precio_min is not None:
-        query = query.filter(Juego.precio >= precio_min)
-    
-    if precio_max is not None:
-        query = query.filter(Juego.precio <= precio_max)
+        query = query.where(Juego.genero == genero)
     
+    # Filtros de precio: se normalizan a un solo predicado de rango
     if solo_gratuitos:
-        query = query.filter(Juego.precio == 0.0)
+        precio_min = precio_max = 0.0
+    
+    if precio_min is not None and precio_max is not None:
+        if precio_min == precio_max:
+            query = query.where(Juego.precio == precio_min)
+        else:
+            query = query.where(Juego.precio.between(precio_min, precio_max))
+    elif precio_min is not None:
+        query = query.where(Juego.precio >= precio_min)
+    elif precio_max is not None:
+        query = query.where(Juego.precio <= precio_max)
     
     # Ordenamiento
     if ordenar_por == "precio":
@@ -217,11 +386,28 @@ async def obtener_catalogo(
     else:
         query = query.order_by(order_col.desc())
     
-    # Paginación
+    # Paginación: se pide una fila extra para saber si hay página siguiente
+    # sin ejecutar un SELECT COUNT(*) aparte
     offset = (pagina - 1) * por_pagina
-    juegos = query.offset(offset).limit(por_pagina).all()
+    juegos = db.execute(query.offset(offset).limit(por_pagina + 1)).mappings().all()
+    has_next = len(juegos) > por_pagina
+    juegos = juegos[:por_pagina]
+    
+    versiones = [
+        _juego_version(j["id"], j["fecha_creacion"], j["fecha_actualizacion"])
+        for j in juegos
+    ]
+    versiones.append(f"has_next:{has_next}")
+    
+    headers = _cache_headers(_etag(*versiones))
+    headers["X-Has-Next"] = "true" if has_next else "false"
+    
+    not_modified = _not_modified(request, headers)
+    if not_modified:
+        return not_modified
     
-    return juegos
+    # Datos confiables de la BD: se construyen sin validar y se devuelven directo
+    return Response(dump_fast(JuegoListResponse, juegos), media_type="application/json", headers=headers)
 
 # ==================== BÚSQUEDA INTELIGENTE CON IA ====================
 
@@ -238,6 +424,12 @@ async def busqueda_inteligente(
     Analiza las descripciones de los juegos para encontrar coincidencias semánticas.
     """
     
+    juegos = await _buscar_juegos_ia(query, db)
+    return Response(dump_validated(JuegoListResponse, juegos), media_type="application/json")
+
+async def _buscar_juegos_ia(query: str, db: Session) -> list:
+    """Devuelve los juegos que coinciden con la búsqueda (ORM, sin serializar)"""
+    
     if not query or len(query.strip()) < 2:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -375,11 +567,22 @@ Si no hay coincidencias, responde: []"""
 @router.get("/{juego_id}", response_model=JuegoResponse)
 async def obtener_juego(
     juego_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
-    """Obtiene los detalles de un juego específico"""
+    """
+    Obtiene los detalles de un juego específico
+    Responde 304 si el cliente ya tiene esta versión (ETag)
+    """
     
-    juego = db.query(Juego).filter(Juego.id == juego_id).first()
+    # El desarrollador en la misma consulta: lo necesitan el ETag y la respuesta
+    juego = (
+        db.query(Juego)
+        .options(joinedload(Juego.desarrollador))
+        .filter(Juego.id == juego_id)
+        .first()
+    )
     
     if not juego:
         raise HTTPException(
@@ -394,6 +597,15 @@ async def obtener_juego(
             detail="Juego no disponible"
         )
     
+    # El detalle incluye al desarrollador: su versión también forma parte del ETag
+    version = _juego_version(juego.id, juego.fecha_creacion, juego.fecha_actualizacion)
+    headers = _cache_headers(_etag(version, _usuario_version(juego.desarrollador)))
+    
+    not_modified = _not_modified(request, headers)
+    if not_modified:
+        return not_modified
+    
+    response.headers.update(headers)
     return juego
 
 # ==================== JUEGOS PENDIENTES (Admin) ====================
@@ -427,7 +639,7 @@ async def obtener_juegos_pendientes(
         Juego.estado == EstadoJuego.EN_REVISION
     ).all()
     
-    return juegos
+    return Response(dump_validated(JuegoResponse, juegos), media_type="application/json")
 
 # ==================== APROBAR/RECHAZAR JUEGO (Admin) ====================
 
@@ -456,7 +668,7 @@ async def aprobar_juego(
         
         # Enviar email al desarrollador
         desarrollador = db.query(Usuario).filter(Usuario.id == juego.desarrollador_id).first()
-        email_service.send_game_approved(
+        await email_service.send_game_approved(
             desarrollador.email,
             desarrollador.nombre,
             juego.titulo
@@ -471,7 +683,7 @@ async def aprobar_juego(
         
         # Enviar email al desarrollador
         desarrollador = db.query(Usuario).filter(Usuario.id == juego.desarrollador_id).first()
-        email_service.send_game_rejected(
+        await email_service.send_game_rejected(
             desarrollador.email,
             desarrollador.nombre,
             juego.titulo,
@@ -565,7 +777,7 @@ async def obtener_resenas(
         Resena.juego_id == juego_id
     ).order_by(Resena.fecha_creacion.desc()).all()
     
-    return resenas
+    return Response(dump_validated(ResenaResponse, resenas), media_type="application/json")
 
 @router.post("/{juego_id}/resenas", response_model=ResenaResponse, status_code=status.HTTP_201_CREATED)
 async def crear_resena(
@@ -588,19 +800,7 @@ async def crear_resena(
             detail="Juego no encontrado"
         )
     
-    # Verificar que el usuario no haya dejado ya una reseña
-    existing_resena = db.query(Resena).filter(
-        Resena.usuario_id == current_user.id,
-        Resena.juego_id == juego_id
-    ).first()
-    
-    if existing_resena:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Ya has dejado una reseña para este juego"
-        )
-    
-    # Crear la reseña
+    # Crear la reseña (la restricción uq_resena_user_juego evita duplicados)
     nueva_resena = Resena(
         usuario_id=current_user.id,
         juego_id=juego_id,
@@ -618,7 +818,16 @@ async def crear_resena(
     total_calificaciones = sum(r.calificacion for r in todas_resenas) + resena_data.calificacion
     juego.calificacion_promedio = total_calificaciones / (len(todas_resenas) + 1)
     
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # El usuario ya había dejado una reseña para este juego
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Ya has dejado una reseña para este juego"
+        )
+    
     db.refresh(nueva_resena)
     
     logger.info(f"Reseña creada para juego {juego_id} por {current_user.email}")
@@ -3,15 +3,141 @@ Schemas Pydantic para validación de datos
 Define la estructura de requests y responses
 """
 
-from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional, List
+from pydantic import BaseModel, BeforeValidator, Field, TypeAdapter, validator
+from pydantic.networks import validate_email
+from typing import Annotated, Literal, Optional, List, Mapping, Union, get_args, get_origin
+from functools import lru_cache
+import orjson
 from datetime import datetime
-from app.models import TipoCuenta, EstadoJuego, TipoDescarga, EstadoCompra
+from app.enums import TipoCuenta, EstadoJuego, TipoDescarga, EstadoCompra
+from app.config import settings
+
+# ==================== BASE PARA RESPONSES ====================
+
+class ORMResponse(BaseModel):
+    """
+    Base para responses construidos a partir de filas de la BD
+    Los datos de la BD ya son confiables: from_orm_fast los copia sin validar
+    """
+    
+    class Config:
+        from_attributes = True
+    
+    @classmethod
+    def from_orm_fast(cls, obj):
+        """
+        Construye el response con model_construct (sin validación)
+        
+        Args:
+            obj: Objeto ORM, Row o mapping con los campos del response
+        
+        Returns:
+            Instancia del response, incluyendo modelos anidados
+        """
+        es_mapping = isinstance(obj, Mapping)
+        data = {}
+        
+        for nombre, (es_lista, anidado) in _campos_response(cls).items():
+            valor = obj[nombre] if es_mapping else getattr(obj, nombre)
+            
+            if anidado is not None and valor is not None:
+                if es_lista:
+                    valor = [anidado.from_orm_fast(v) for v in valor]
+                else:
+                    valor = anidado.from_orm_fast(valor)
+            
+            data[nombre] = valor
+        
+        return cls.model_construct(**data)
+
+class ORMListItem(ORMResponse):
+    """
+    Base para responses que se crean N veces por lista (catálogo, carrito, compras, biblioteca)
+    Inmutables y sin campos extra, para que pydantic-core no registre atributos adicionales
+    """
+    
+    class Config:
+        frozen = True
+        extra = "forbid"
+
+@lru_cache(maxsize=None)
+def _campos_response(cls) -> dict:
+    """
+    Analiza una vez por clase qué campos son responses anidados
+    
+    Returns:
+        Dict nombre -> (es_lista, clase anidada o None)
+    """
+    campos = {}
+    
+    for nombre, field in cls.model_fields.items():
+        tipo = field.annotation
+        es_lista = False
+        
+        # Optional[X] -> X
+        if get_origin(tipo) is Union:
+            tipo = next(arg for arg in get_args(tipo) if arg is not type(None))
+        
+        # List[X] -> X
+        if get_origin(tipo) is list:
+            es_lista = True
+            tipo = get_args(tipo)[0]
+        
+        anidado = tipo if isinstance(tipo, type) and issubclass(tipo, ORMResponse) else None
+        campos[nombre] = (es_lista, anidado)
+    
+    return campos
+
+def _orjson_default(obj):
+    """Tipos que orjson no serializa por sí mismo: responses anidados y el resto como texto"""
+    if isinstance(obj, BaseModel):
+        return obj.__dict__
+    return str(obj)
+
+def orjson_dumps(models) -> bytes:
+    """
+    Serializa una lista de responses con orjson leyendo directamente sus campos
+    (datetime y enums los convierte orjson; evita el serializador de pydantic)
+    """
+    return orjson.dumps([m.__dict__ for m in models], default=_orjson_default)
+
+def dump_fast(response_cls, objs) -> bytes:
+    """
+    Construye responses sin validar y los serializa a JSON
+    Para endpoints de listas que devuelven la respuesta directamente
+    """
+    return orjson_dumps([response_cls.from_orm_fast(obj) for obj in objs])
+
+@lru_cache(maxsize=64)
+def list_adapter(cls) -> TypeAdapter:
+    """TypeAdapter de List[cls], creado una sola vez por response"""
+    return TypeAdapter(List[cls])
+
+def dump_validated(response_cls, objs) -> bytes:
+    """
+    Valida una lista de objetos ORM en una sola pasada de pydantic-core
+    y la serializa a JSON, para endpoints que sí necesitan validación
+    """
+    adapter = list_adapter(response_cls)
+    return adapter.dump_json(adapter.validate_python(objs, from_attributes=True))
 
 # ==================== USUARIO SCHEMAS ====================
 
+@lru_cache(maxsize=10_000)
+def _normalizar_email(email: str) -> str:
+    """Valida y normaliza un email igual que EmailStr, recordando los ya vistos"""
+    return validate_email(email)[1]
+
+def _email_cacheado(value):
+    return _normalizar_email(value) if isinstance(value, str) else value
+
+# Equivalente a EmailStr, pero los logins repetidos no vuelven a pasar por email-validator
+# (format: email se declara a mano para que el esquema OpenAPI siga igual que con EmailStr)
+EmailNormalizado = Annotated[str, BeforeValidator(_email_cacheado), Field(json_schema_extra={"format": "email"})]
+
+
 class UsuarioBase(BaseModel):
-    email: EmailStr
+    email: EmailNormalizado
     nombre: str = Field(..., min_length=2, max_length=100)
 
 class UsuarioCreate(UsuarioBase):
@@ -19,19 +145,16 @@ class UsuarioCreate(UsuarioBase):
     tipo_cuenta: TipoCuenta = TipoCuenta.COMPRADOR
 
 class UsuarioLogin(BaseModel):
-    email: EmailStr
+    email: EmailNormalizado
     password: str
 
-class UsuarioResponse(UsuarioBase):
+class UsuarioResponse(ORMResponse, UsuarioBase):
     id: int
     tipo_cuenta: TipoCuenta
     verificado: bool
     avatar_url: Optional[str] = None
     bio: Optional[str] = None
     fecha_registro: datetime
-    
-    class Config:
-        from_attributes = True
 
 class UsuarioUpdate(BaseModel):
     nombre: Optional[str] = None
@@ -62,7 +185,7 @@ class JuegoBase(BaseModel):
     precio: float = Field(..., ge=0.0)
     requisitos: Optional[str] = None
 
-class JuegoResponseBase(BaseModel):
+class JuegoResponseBase(ORMResponse):
     """Base para respuestas sin validaciones min_length (datos ya en BD)"""
     titulo: str
     descripcion: str
@@ -91,7 +214,7 @@ class JuegoUpdate(BaseModel):
 class JuegoResponse(JuegoResponseBase):
     id: int
     portada_url: str
-    screenshots_urls: Optional[str] = None
+    screenshots_urls: Optional[List[str]] = None
     trailer_url: Optional[str] = None
     tipo_descarga: TipoDescarga
     archivo_juego_url: str
@@ -106,11 +229,8 @@ class JuegoResponse(JuegoResponseBase):
     
     # Info del desarrollador
     desarrollador: Optional[UsuarioResponse] = None
-    
-    class Config:
-        from_attributes = True
 
-class JuegoListResponse(BaseModel):
+class JuegoListResponse(ORMListItem):
     """Response simplificado para listas/catálogo"""
     id: int
     titulo: str
@@ -121,9 +241,21 @@ class JuegoListResponse(BaseModel):
     calificacion_promedio: float
     total_resenas: int
     estado: EstadoJuego
-    
-    class Config:
-        from_attributes = True
+
+class FirmaSubida(BaseModel):
+    """Campos para subir un archivo directamente a Cloudinary desde el navegador"""
+    upload_url: str
+    api_key: str
+    timestamp: int
+    folder: str
+    signature: str
+
+class ArchivoSubido(BaseModel):
+    """Respuesta de Cloudinary tras una subida directa"""
+    public_id: str
+    version: int
+    signature: str
+    secure_url: str
 
 class JuegoApproval(BaseModel):
     """Schema para aprobar/rechazar juegos"""
@@ -135,14 +267,11 @@ class JuegoApproval(BaseModel):
 class CarritoItemCreate(BaseModel):
     juego_id: int
 
-class CarritoItemResponse(BaseModel):
+class CarritoItemResponse(ORMListItem):
     id: int
     juego_id: int
     fecha_agregado: datetime
     juego: JuegoListResponse
-    
-    class Config:
-        from_attributes = True
 
 # ==================== COMPRA SCHEMAS ====================
 
@@ -150,16 +279,13 @@ class CompraCreate(BaseModel):
     juegos_ids: List[int]
     metodo_pago: str = "tarjeta"
 
-class ItemCompraResponse(BaseModel):
+class ItemCompraResponse(ORMListItem):
     id: int
     juego_id: int
     precio: float
     juego: JuegoListResponse
-    
-    class Config:
-        from_attributes = True
 
-class CompraResponse(BaseModel):
+class CompraResponse(ORMResponse):
     id: int
     usuario_id: int
     subtotal: float
@@ -171,9 +297,6 @@ class CompraResponse(BaseModel):
     recibo_url: Optional[str] = None
     fecha_compra: datetime
     items: List[ItemCompraResponse]
-    
-    class Config:
-        from_attributes = True
 
 # ==================== RESEÑA SCHEMAS ====================
 
@@ -186,7 +309,7 @@ class ResenaUpdate(BaseModel):
     calificacion: Optional[int] = Field(None, ge=1, le=5)
     texto: Optional[str] = Field(None, min_length=10, max_length=1000)
 
-class ResenaResponse(BaseModel):
+class ResenaResponse(ORMResponse):
     id: int
     usuario_id: int
     juego_id: int
@@ -194,24 +317,22 @@ class ResenaResponse(BaseModel):
     texto: str
     fecha_creacion: datetime
     usuario: UsuarioResponse
-    
-    class Config:
-        from_attributes = True
 
 # ==================== BIBLIOTECA SCHEMAS ====================
 
-class BibliotecaItemResponse(BaseModel):
+class BibliotecaItemResponse(ORMListItem):
     id: int
     juego_id: int
     fecha_obtencion: datetime
     es_gratuito: bool
     juego: JuegoResponse
-    
-    class Config:
-        from_attributes = True
 
 # ==================== BÚSQUEDA Y FILTROS ====================
 
+# Valores válidos de ordenamiento: pydantic-core los valida contra un conjunto fijo
+OrdenarPor = Literal["fecha_creacion", "precio", "calificacion"]
+Orden = Literal["asc", "desc"]
+
 class JuegosFiltros(BaseModel):
     """Parámetros de búsqueda y filtrado"""
     busqueda: Optional[str] = None
@@ -219,10 +340,10 @@ class JuegosFiltros(BaseModel):
     precio_min: Optional[float] = None
     precio_max: Optional[float] = None
     solo_gratuitos: bool = False
-    ordenar_por: str = "fecha_creacion"  # fecha_creacion, precio, calificacion
-    orden: str = "desc"  # asc o desc
-    pagina: int = 1
-    por_pagina: int = 20
+    ordenar_por: OrdenarPor = "fecha_creacion"
+    orden: Orden = "desc"
+    pagina: int = Field(1, ge=1)
+    por_pagina: int = Field(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE)
 
 # ==================== RESPUESTAS GENÉRICAS ====================
 
@@ -247,3 +368,11 @@ class EstadisticasAdmin(BaseModel):
     ingresos_totales: float
     usuarios_nuevos_mes: int
     ventas_mes: int
+
+# ==================== ADAPTERS DE LISTAS ====================
+# Se construyen al importar (no en la primera petición) y quedan en la caché de
+# list_adapter, de donde los toma dump_validated. Solo los de responses que pasan
+# por dump_validated: compras, carrito y biblioteca usan dump_fast y no necesitan adapter
+
+for _response_cls in (JuegoListResponse, JuegoResponse, ResenaResponse):
+    list_adapter(_response_cls)
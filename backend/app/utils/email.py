@@ -3,14 +3,40 @@ Utilidades para envío de emails
 Usa SendGrid para emails transaccionales
 """
 
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, Email, To, Content
+from sendgrid.helpers.mail import Mail, Email, To, Content, Personalization
 from app.config import settings
 from typing import Optional
+from string import Template
+import httpx
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+SENDGRID_API_URL = "https://api.sendgrid.com/v3/mail/send"
+# Máximo de personalizations que SendGrid acepta en una sola petición
+SENDGRID_MAX_PERSONALIZATIONS = 1000
+
+# ==================== PLANTILLAS ====================
+# El HTML vive en app/templates/email; se lee y compila una sola vez al importar
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates", "email")
+
+def _cargar_plantilla(nombre: str) -> Template:
+    """Lee una plantilla HTML de TEMPLATES_DIR"""
+    with open(os.path.join(TEMPLATES_DIR, nombre), encoding="utf-8") as f:
+        return Template(f.read())
+
+VERIFICATION_TPL = _cargar_plantilla("verificacion.html")
+ITEM_TPL = _cargar_plantilla("compra_item.html")
+PURCHASE_TPL = _cargar_plantilla("compra.html")
+APPROVED_TPL = _cargar_plantilla("juego_aprobado.html")
+REJECTED_TPL = _cargar_plantilla("juego_rechazado.html")
+
+# Fragmento de cada juego en la confirmación de compra, como plantilla de str.format:
+# el formato del precio (.2f) queda dentro de la plantilla y cada item es una sola pasada
+_ITEM_TPL = ITEM_TPL.safe_substitute(titulo="{titulo}", precio="{precio:.2f}", url="{url}")
+
 class EmailService:
     """Servicio para envío de correos electrónicos"""
     
@@ -20,12 +46,22 @@ class EmailService:
         self.from_name = settings.SENDGRID_FROM_NAME
         
         if self.api_key:
-            self.client = SendGridAPIClient(self.api_key)
+            # Cliente async con conexiones reutilizables: no bloquea el event loop
+            self.client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                limits=httpx.Limits(max_keepalive_connections=10),
+                timeout=30.0
+            )
         else:
             self.client = None
             logger.warning("SendGrid API key no configurada - modo simulación")
     
-    def send_email(
+    async def close(self):
+        """Cierra las conexiones del cliente HTTP (al apagar la app)"""
+        if self.client:
+            await self.client.aclose()
+    
+    async def send_email(
         self,
         to_email: str,
         subject: str,
@@ -66,19 +102,7 @@ class EmailService:
             if plain_content:
                 message.add_content(Content("text/plain", plain_content))
             
-            logger.info(f"[EMAIL] Enviando a través de SendGrid...")
-            response = self.client.send(message)
-            
-            logger.info(f"[EMAIL] Respuesta de SendGrid: {response.status_code}")
-            logger.info(f"[EMAIL] Headers: {response.headers}")
-            
-            if response.status_code in [200, 201, 202]:
-                logger.info(f"✅ [EMAIL] Email enviado exitosamente a {to_email}")
-                return True
-            else:
-                logger.error(f"❌ [EMAIL] Error al enviar email: {response.status_code}")
-                logger.error(f"[EMAIL] Body: {response.body}")
-                return False
+            return await self._post(message, to_email)
                 
         except Exception as e:
             logger.error(f"❌ [EMAIL] Excepción al enviar email: {str(e)}")
@@ -86,57 +110,74 @@ class EmailService:
             logger.error(f"[EMAIL] Traceback: {traceback.format_exc()}")
             return False
     
-    def send_verification_email(self, to_email: str, nombre: str, token: str) -> bool:
+    async def _post(self, message: Mail, destino: str) -> bool:
+        """Envía un mensaje ya armado a la API de SendGrid"""
+        logger.info(f"[EMAIL] Enviando a través de SendGrid...")
+        response = await self.client.post(SENDGRID_API_URL, json=message.get())
+        
+        logger.info(f"[EMAIL] Respuesta de SendGrid: {response.status_code}")
+        logger.info(f"[EMAIL] Headers: {response.headers}")
+        
+        if response.status_code in [200, 201, 202]:
+            logger.info(f"✅ [EMAIL] Email enviado exitosamente a {destino}")
+            return True
+        else:
+            logger.error(f"❌ [EMAIL] Error al enviar email: {response.status_code}")
+            logger.error(f"[EMAIL] Body: {response.text}")
+            return False
+    
+    async def send_template(self, template_id: str, destinatarios: list) -> bool:
+        """
+        Envía una plantilla dinámica de SendGrid a uno o varios destinatarios
+        SendGrid renderiza el HTML; se hace una petición por cada 1000 destinatarios
+        
+        Args:
+            template_id: ID de la plantilla dinámica (d-...)
+            destinatarios: Lista de tuplas (email, dynamic_template_data)
+        
+        Returns:
+            True si todas las peticiones se enviaron exitosamente
+        """
+        if not self.client:
+            # Modo simulación
+            for to_email, _ in destinatarios:
+                logger.warning(f"[SIMULACIÓN] Plantilla {template_id} a {to_email}")
+            return True
+        
+        ok = True
+        for inicio in range(0, len(destinatarios), SENDGRID_MAX_PERSONALIZATIONS):
+            lote = destinatarios[inicio:inicio + SENDGRID_MAX_PERSONALIZATIONS]
+            
+            try:
+                message = Mail(from_email=Email(self.from_email, self.from_name))
+                message.template_id = template_id
+                
+                for to_email, data in lote:
+                    personalization = Personalization()
+                    personalization.add_to(To(to_email))
+                    personalization.dynamic_template_data = data
+                    message.add_personalization(personalization)
+                
+                ok = await self._post(message, f"{len(lote)} destinatarios") and ok
+                
+            except Exception as e:
+                logger.error(f"❌ [EMAIL] Excepción al enviar plantilla {template_id}: {str(e)}")
+                ok = False
+        
+        return ok
+    
+    async def send_verification_email(self, to_email: str, nombre: str, token: str) -> bool:
         """Envía email de verificación de cuenta"""
         
         verify_url = f"{settings.FRONTEND_URL}/verificar?token={token}"
         
         subject = settings.EMAIL_VERIFICATION_SUBJECT
         
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(90deg, #4ea3ff, #7b61ff); padding: 20px; text-align: center; color: white; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .button {{ display: inline-block; padding: 12px 24px; background: linear-gradient(90deg, #4ea3ff, #7b61ff); color: white; text-decoration: none; border-radius: 8px; margin: 20px 0; }}
-                .footer {{ text-align: center; color: #666; font-size: 12px; margin-top: 20px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🎮 Bienvenido a Pyxolotl</h1>
-                </div>
-                <div class="content">
-                    <h2>¡Hola {nombre}!</h2>
-                    <p>Gracias por registrarte en Pyxolotl, la plataforma para desarrolladores indie mexicanos.</p>
-                    <p>Para activar tu cuenta, por favor verifica tu correo electrónico haciendo clic en el siguiente botón:</p>
-                    <div style="text-align: center;">
-                        <a href="{verify_url}" class="button">Verificar mi cuenta</a>
-                    </div>
-                    <p>O copia y pega este enlace en tu navegador:</p>
-                    <p style="background: #fff; padding: 10px; border-radius: 5px; word-break: break-all;">
-                        {verify_url}
-                    </p>
-                    <p>Este enlace expirará en 24 horas.</p>
-                    <p>Si no creaste esta cuenta, puedes ignorar este mensaje.</p>
-                </div>
-                <div class="footer">
-                    <p>© 2025 Pyxolotl - Plataforma de Videojuegos Indie</p>
-                    <p>Este es un correo automático, por favor no respondas.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        html_content = VERIFICATION_TPL.substitute(nombre=nombre, verify_url=verify_url)
         
-        return self.send_email(to_email, subject, html_content)
+        return await self.send_email(to_email, subject, html_content)
     
-    def send_purchase_confirmation(
+    async def send_purchase_confirmation(
         self,
         to_email: str,
         nombre: str,
@@ -148,86 +189,54 @@ class EmailService:
         
         subject = settings.EMAIL_PURCHASE_SUBJECT
         
+        # Con plantilla dinámica configurada, SendGrid arma el HTML
+        if settings.SENDGRID_PURCHASE_TEMPLATE_ID:
+            return await self.send_template(
+                settings.SENDGRID_PURCHASE_TEMPLATE_ID,
+                [(to_email, {
+                    "subject": subject,
+                    "nombre": nombre,
+                    "numero_orden": numero_orden,
+                    "total": f"{total:.2f}",
+                    "juegos": [
+                        {"titulo": juego['titulo'], "precio": f"{juego['precio']:.2f}"}
+                        for juego in juegos
+                    ],
+                    "biblioteca_url": f"{settings.FRONTEND_URL}/biblioteca"
+                })]
+            )
+        
         # Generar lista de juegos
-        juegos_html = ""
-        for juego in juegos:
-            download_url = f"{settings.FRONTEND_URL}/biblioteca"
-            juegos_html += f"""
-            <div style="background: white; padding: 15px; margin: 10px 0; border-radius: 8px; border-left: 4px solid #7b61ff;">
-                <h3 style="margin: 0 0 10px 0;">🎮 {juego['titulo']}</h3>
-                <p style="margin: 5px 0;">Precio: ${juego['precio']:.2f} USD</p>
-                <a href="{download_url}" style="color: #7b61ff; text-decoration: none;">📥 Ir a mi biblioteca →</a>
-            </div>
-            """
+        download_url = f"{settings.FRONTEND_URL}/biblioteca"
+        juegos_html = "".join([
+            _ITEM_TPL.format(titulo=juego['titulo'], precio=juego['precio'], url=download_url)
+            for juego in juegos
+        ])
         
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(90deg, #4ea3ff, #7b61ff); padding: 20px; text-align: center; color: white; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .button {{ display: inline-block; padding: 12px 24px; background: linear-gradient(90deg, #4ea3ff, #7b61ff); color: white; text-decoration: none; border-radius: 8px; margin: 20px 0; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>✅ ¡Compra Confirmada!</h1>
-                </div>
-                <div class="content">
-                    <h2>¡Gracias por tu compra, {nombre}!</h2>
-                    <p><strong>Número de orden:</strong> {numero_orden}</p>
-                    <p><strong>Total pagado:</strong> ${total:.2f} USD</p>
-                    
-                    <h3>Tus juegos:</h3>
-                    {juegos_html}
-                    
-                    <div style="text-align: center; margin-top: 30px;">
-                        <a href="{settings.FRONTEND_URL}/biblioteca" class="button">Ir a mi biblioteca</a>
-                    </div>
-                    
-                    <p style="margin-top: 20px;">Puedes descargar tus juegos en cualquier momento desde tu biblioteca.</p>
-                </div>
-                <div style="text-align: center; color: #666; font-size: 12px; margin-top: 20px;">
-                    <p>© 2025 Pyxolotl - Plataforma de Videojuegos Indie</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        html_content = PURCHASE_TPL.substitute(
+            nombre=nombre,
+            numero_orden=numero_orden,
+            total=f"{total:.2f}",
+            juegos_html=juegos_html,
+            frontend_url=settings.FRONTEND_URL
+        )
         
-        return self.send_email(to_email, subject, html_content)
+        return await self.send_email(to_email, subject, html_content)
     
-    def send_game_approved(self, to_email: str, nombre: str, titulo_juego: str) -> bool:
+    async def send_game_approved(self, to_email: str, nombre: str, titulo_juego: str) -> bool:
         """Notifica que un juego fue aprobado"""
         
         subject = settings.EMAIL_GAME_APPROVED_SUBJECT
         
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <body style="font-family: Arial, sans-serif; padding: 20px;">
-            <div style="max-width: 600px; margin: 0 auto; background: #f9f9f9; padding: 30px; border-radius: 10px;">
-                <h1 style="color: #4CAF50;">🎉 ¡Tu juego ha sido aprobado!</h1>
-                <p>Hola {nombre},</p>
-                <p>Tenemos excelentes noticias: tu juego <strong>"{titulo_juego}"</strong> ha sido revisado y aprobado.</p>
-                <p>Ya está visible en el catálogo público de Pyxolotl y los usuarios pueden comprarlo.</p>
-                <div style="text-align: center; margin: 30px 0;">
-                    <a href="{settings.FRONTEND_URL}/" style="display: inline-block; padding: 12px 24px; background: #4CAF50; color: white; text-decoration: none; border-radius: 8px;">Ver en catálogo</a>
-                </div>
-                <p>¡Mucha suerte con las ventas!</p>
-                <p style="color: #666; font-size: 12px; margin-top: 30px;">- El equipo de Pyxolotl</p>
-            </div>
-        </body>
-        </html>
-        """
+        html_content = APPROVED_TPL.substitute(
+            nombre=nombre,
+            titulo_juego=titulo_juego,
+            frontend_url=settings.FRONTEND_URL
+        )
         
-        return self.send_email(to_email, subject, html_content)
+        return await self.send_email(to_email, subject, html_content)
     
-    def send_game_rejected(
+    async def send_game_rejected(
         self,
         to_email: str,
         nombre: str,
@@ -238,27 +247,13 @@ class EmailService:
         
         subject = settings.EMAIL_GAME_REJECTED_SUBJECT
         
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <body style="font-family: Arial, sans-serif; padding: 20px;">
-            <div style="max-width: 600px; margin: 0 auto; background: #f9f9f9; padding: 30px; border-radius: 10px;">
-                <h1 style="color: #ff6b6b;">Tu juego necesita cambios</h1>
-                <p>Hola {nombre},</p>
-                <p>Hemos revisado tu juego <strong>"{titulo_juego}"</strong> y necesita algunos ajustes antes de ser publicado:</p>
-                <div style="background: white; padding: 15px; margin: 20px 0; border-left: 4px solid #ff6b6b; border-radius: 5px;">
-                    <p><strong>Motivo:</strong></p>
-                    <p>{motivo}</p>
-                </div>
-                <p>Por favor realiza los cambios necesarios y vuelve a enviar tu juego para revisión.</p>
-                <p>Si tienes dudas, no dudes en contactarnos.</p>
-                <p style="color: #666; font-size: 12px; margin-top: 30px;">- El equipo de Pyxolotl</p>
-            </div>
-        </body>
-        </html>
-        """
+        html_content = REJECTED_TPL.substitute(
+            nombre=nombre,
+            titulo_juego=titulo_juego,
+            motivo=motivo
+        )
         
-        return self.send_email(to_email, subject, html_content)
+        return await self.send_email(to_email, subject, html_content)
 
 # Instancia global del servicio
 email_service = EmailService()
\ No newline at end of file
@@ -4,12 +4,20 @@ Upload local y a Cloudinary según tamaño
 """
 
 import os
+import re
+import time
+import asyncio
+import aiofiles
+import filetype
+import httpx
 import cloudinary
+import cloudinary.api
 import cloudinary.uploader
+import cloudinary.utils
 from fastapi import UploadFile
 from app.config import settings
 from app.utils.security import generate_unique_filename, sanitize_filename
-from typing import Optional, Tuple
+from typing import Optional, Tuple, List, Dict
 import logging
 
 logger = logging.getLogger(__name__)
@@ -30,21 +38,90 @@ JUEGOS_DIR = os.path.join(UPLOAD_DIR, "juegos")
 AVATARES_DIR = os.path.join(UPLOAD_DIR, "avatares")
 TEMP_DIR = os.path.join(UPLOAD_DIR, "temp")
 
+# Tamaño de bloque para copiar uploads sin cargarlos completos en memoria
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+CLOUDINARY_CHUNK_SIZE = 6_000_000
+
+# Máximo de public_ids por llamada a cloudinary.api.delete_resources
+CLOUDINARY_DELETE_BATCH = 100
+
+# Bytes iniciales que se leen para detectar el tipo real del archivo
+SNIFF_SIZE = 4096
+
+# https://res.cloudinary.com/<cloud>/<resource_type>/upload/[v123/]<public_id>
+CLOUDINARY_URL_RE = re.compile(r'/(image|video|raw)/upload/(?:v\d+/)?(.+)$')
+
 # Crear directorios si no existen
 for directory in [UPLOAD_DIR, JUEGOS_DIR, AVATARES_DIR, TEMP_DIR]:
     os.makedirs(directory, exist_ok=True)
 
+class ArchivoMuyGrande(ValueError):
+    """El archivo supera el tamaño máximo permitido"""
+    pass
+
+class TipoArchivoInvalido(ValueError):
+    """El contenido del archivo no corresponde a un formato permitido"""
+    pass
+
+class _SinCerrar:
+    """
+    Envuelve el archivo temporal de un UploadFile para que upload_large
+    (que lo usa dentro de un `with`) no lo cierre al terminar
+    """
+    
+    def __init__(self, file):
+        self._file = file
+    
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
 class FileService:
     """Servicio para manejo de archivos"""
     
     @staticmethod
     def get_file_size_mb(file: UploadFile) -> float:
-        """Obtiene el tamaño de un archivo en MB"""
-        file.file.seek(0, 2)  # Ir al final
-        size_bytes = file.file.tell()
-        file.file.seek(0)  # Volver al inicio
+        """
+        Obtiene el tamaño de un archivo en MB
+        Usa el tamaño que registra Starlette al recibir el upload; solo si
+        no está disponible lo mide con seek/tell
+        """
+        size_bytes = file.size
+        if size_bytes is None:
+            file.file.seek(0, 2)  # Ir al final
+            size_bytes = file.file.tell()
+            file.file.seek(0)  # Volver al inicio
         return size_bytes / (1024 * 1024)  # Convertir a MB
     
+    @staticmethod
+    async def validate_file_type(file: UploadFile, allowed_formats: list, descripcion: str):
+        """
+        Detecta el formato por los primeros bytes del archivo (no por la extensión)
+        y lo rechaza antes de copiarlo o subirlo
+        
+        Args:
+            file: Archivo a validar
+            allowed_formats: Extensiones permitidas (ALLOWED_*_FORMATS)
+            descripcion: Nombre del tipo de archivo para el mensaje de error
+        
+        Raises:
+            TipoArchivoInvalido: Si el formato detectado no está permitido
+        """
+        await file.seek(0)
+        header = await file.read(SNIFF_SIZE)
+        await file.seek(0)
+        
+        kind = filetype.guess(header)
+        if kind is None or kind.extension not in allowed_formats:
+            raise TipoArchivoInvalido(
+                f"{descripcion} no válido. Formatos permitidos: {', '.join(allowed_formats)}"
+            )
+    
     @staticmethod
     async def save_local_file(
         file: UploadFile,
@@ -73,10 +150,11 @@ class FileService:
             
             file_path = os.path.join(directory, unique_filename)
             
-            # Guardar archivo
-            contents = await file.read()
-            with open(file_path, "wb") as f:
-                f.write(contents)
+            # Guardar archivo por bloques
+            await file.seek(0)
+            async with aiofiles.open(file_path, "wb") as f:
+                while chunk := await file.read(CHUNK_SIZE):
+                    await f.write(chunk)
             
             # Resetear posición del archivo
             await file.seek(0)
@@ -113,18 +191,20 @@ class FileService:
             return None
         
         try:
-            # Leer contenido del archivo
-            contents = await file.read()
+            # Subir a Cloudinary por partes, leyendo directo del archivo temporal.
+            # El SDK es bloqueante: se ejecuta en un hilo para no detener el event loop
             await file.seek(0)
-            
-            # Subir a Cloudinary
-            result = cloudinary.uploader.upload(
-                contents,
+            result = await asyncio.to_thread(
+                cloudinary.uploader.upload_large,
+                _SinCerrar(file.file),
+                chunk_size=CLOUDINARY_CHUNK_SIZE,
+                filename=file.filename,
                 folder=folder,
                 resource_type=resource_type,
                 use_filename=True,
                 unique_filename=True
             )
+            await file.seek(0)
             
             url = result.get("secure_url")
             logger.info(f"Archivo subido a Cloudinary: {url}")
@@ -135,6 +215,26 @@ class FileService:
             logger.error(f"Error al subir a Cloudinary: {str(e)}")
             return None
     
+    @staticmethod
+    async def validate_file(
+        file: UploadFile,
+        max_size_mb: int,
+        allowed_formats: list,
+        nombre: str,
+        descripcion_formato: str
+    ):
+        """
+        Valida tamaño y formato real de un archivo sin guardarlo
+        
+        Raises:
+            ArchivoMuyGrande: Si supera max_size_mb
+            TipoArchivoInvalido: Si el formato detectado no está permitido
+        """
+        if FileService.get_file_size_mb(file) > max_size_mb:
+            raise ArchivoMuyGrande(f"{nombre} muy grande. Máximo: {max_size_mb}MB")
+        
+        await FileService.validate_file_type(file, allowed_formats, descripcion_formato)
+    
     @staticmethod
     async def save_image(
         file: UploadFile,
@@ -152,10 +252,9 @@ class FileService:
         Returns:
             URL pública de la imagen
         """
-        # Validar tamaño
+        # Validar tamaño y formato real
+        await FileService.validate_file(file, settings.MAX_IMAGE_SIZE_MB, settings.ALLOWED_IMAGE_FORMATS, "Imagen", "Formato de imagen")
         size_mb = FileService.get_file_size_mb(file)
-        if size_mb > settings.MAX_IMAGE_SIZE_MB:
-            raise ValueError(f"Imagen muy grande. Máximo: {settings.MAX_IMAGE_SIZE_MB}MB")
         
         # Decidir dónde guardar según tamaño
         if size_mb > 2:  # Imágenes >2MB a Cloudinary
@@ -185,10 +284,9 @@ class FileService:
         Returns:
             URL pública del video
         """
-        # Validar tamaño
+        # Validar tamaño y formato real
+        await FileService.validate_file(file, settings.MAX_VIDEO_SIZE_MB, settings.ALLOWED_VIDEO_FORMATS, "Video", "Formato de video")
         size_mb = FileService.get_file_size_mb(file)
-        if size_mb > settings.MAX_VIDEO_SIZE_MB:
-            raise ValueError(f"Video muy grande. Máximo: {settings.MAX_VIDEO_SIZE_MB}MB")
         
         # Videos >10MB a Cloudinary (casi siempre)
         if size_mb > 10:
@@ -215,10 +313,9 @@ class FileService:
         Returns:
             Tupla (URL, tamaño en MB)
         """
-        # Validar tamaño
+        # Validar tamaño y formato real
+        await FileService.validate_file(file, settings.MAX_GAME_SIZE_MB, settings.ALLOWED_GAME_FORMATS, "Archivo", "Formato de archivo de juego")
         size_mb = FileService.get_file_size_mb(file)
-        if size_mb > settings.MAX_GAME_SIZE_MB:
-            raise ValueError(f"Archivo muy grande. Máximo: {settings.MAX_GAME_SIZE_MB}MB")
         
         # SIEMPRE subir a Cloudinary (Railway no persiste archivos locales)
         folder = f"pyxolotl/juegos/{juego_id}/archivos"
@@ -235,6 +332,173 @@ class FileService:
         
         return url, size_mb
     
+    @staticmethod
+    async def save_game_assets(
+        portada: UploadFile,
+        screenshots: List[UploadFile],
+        trailer: Optional[UploadFile] = None,
+        archivo: Optional[UploadFile] = None,
+        juego_id: Optional[int] = None
+    ) -> Tuple[str, List[str], Optional[str], Optional[Tuple[str, float]]]:
+        """
+        Sube todos los archivos de un juego en paralelo
+        
+        Args:
+            portada: Imagen de portada
+            screenshots: Capturas (se omiten las vacías)
+            trailer: Video opcional (se omite si está vacío)
+            archivo: Archivo del juego opcional
+            juego_id: ID del juego (opcional)
+        
+        Returns:
+            Tupla (URL portada, URLs screenshots, URL trailer, (URL archivo, tamaño MB))
+        
+        Raises:
+            ArchivoMuyGrande / TipoArchivoInvalido antes de subir nada, o la primera
+            excepción de las subidas una vez terminadas todas (los archivos que sí se
+            subieron se eliminan)
+        """
+        if trailer is not None and not (trailer.size and trailer.size > 0):
+            trailer = None
+        screenshots = [s for s in screenshots if s.size and s.size > 0]
+        
+        # Validar todo antes de subir: un archivo inválido no deja huérfanos los demás
+        await FileService.validate_file(portada, settings.MAX_IMAGE_SIZE_MB, settings.ALLOWED_IMAGE_FORMATS, "Imagen", "Formato de imagen")
+        for screenshot in screenshots:
+            await FileService.validate_file(screenshot, settings.MAX_IMAGE_SIZE_MB, settings.ALLOWED_IMAGE_FORMATS, "Imagen", "Formato de imagen")
+        if trailer:
+            await FileService.validate_file(trailer, settings.MAX_VIDEO_SIZE_MB, settings.ALLOWED_VIDEO_FORMATS, "Video", "Formato de video")
+        if archivo:
+            await FileService.validate_file(archivo, settings.MAX_GAME_SIZE_MB, settings.ALLOWED_GAME_FORMATS, "Archivo", "Formato de archivo de juego")
+        
+        async def nada():
+            return None
+        
+        tareas = [
+            FileService.save_image(portada, juego_id, "portada"),
+            FileService.save_video(trailer, juego_id or 0) if trailer else nada(),
+            FileService.save_game_file(archivo, juego_id or 0) if archivo else nada(),
+        ]
+        tareas += [
+            FileService.save_image(screenshot, juego_id, f"screenshot_{idx}")
+            for idx, screenshot in enumerate(screenshots)
+        ]
+        
+        resultados = await asyncio.gather(*tareas, return_exceptions=True)
+        
+        errores = [r for r in resultados if isinstance(r, BaseException)]
+        if errores:
+            subidos = [
+                r[0] if isinstance(r, tuple) else r
+                for r in resultados
+                if r is not None and not isinstance(r, BaseException)
+            ]
+            await FileService.delete_many(subidos)
+            raise errores[0]
+        
+        portada_url, trailer_url, archivo_resultado, *screenshots_urls = resultados
+        return portada_url, screenshots_urls, trailer_url, archivo_resultado
+    
+    @staticmethod
+    def sign_upload(folder: str, resource_type: str = "raw") -> dict:
+        """
+        Firma una subida directa del navegador a Cloudinary
+        El archivo no pasa por el backend; el cliente envía estos campos junto al archivo
+        
+        Args:
+            folder: Carpeta de Cloudinary donde debe quedar el archivo
+            resource_type: Tipo de recurso (image, video, raw)
+        
+        Returns:
+            Dict con upload_url, api_key, timestamp, folder y signature
+        """
+        params = {"folder": folder, "timestamp": int(time.time())}
+        signature = cloudinary.utils.api_sign_request(params, settings.CLOUDINARY_API_SECRET)
+        
+        return {
+            "upload_url": f"https://api.cloudinary.com/v1_1/{settings.CLOUDINARY_CLOUD_NAME}/{resource_type}/upload",
+            "api_key": settings.CLOUDINARY_API_KEY,
+            "signature": signature,
+            **params
+        }
+    
+    @staticmethod
+    def verify_direct_upload(
+        public_id: str,
+        version: int,
+        signature: str,
+        secure_url: str,
+        folder: str,
+        resource_type: str = "raw"
+    ) -> bool:
+        """
+        Verifica la respuesta de Cloudinary de una subida directa: la firma,
+        que el archivo esté en la carpeta firmada y que la URL corresponda al public_id
+        """
+        if not public_id.startswith(f"{folder}/"):
+            return False
+        
+        url_esperada = (
+            f"https://res.cloudinary.com/{settings.CLOUDINARY_CLOUD_NAME}/"
+            f"{resource_type}/upload/v{version}/{public_id}"
+        )
+        if not secure_url.startswith(url_esperada):
+            return False
+        
+        return cloudinary.utils.verify_api_response_signature(public_id, version, signature)
+    
+    @staticmethod
+    def _inspeccionar_subida(public_id: str, secure_url: str, resource_type: str) -> Tuple[int, bytes]:
+        """Lee de Cloudinary el tamaño real de un recurso y sus primeros SNIFF_SIZE bytes"""
+        recurso = cloudinary.api.resource(public_id, resource_type=resource_type)
+        
+        respuesta = httpx.get(secure_url, headers={"Range": f"bytes=0-{SNIFF_SIZE - 1}"}, timeout=30.0)
+        respuesta.raise_for_status()
+        
+        return recurso["bytes"], respuesta.content[:SNIFF_SIZE]
+    
+    @staticmethod
+    async def check_direct_upload(
+        public_id: str,
+        secure_url: str,
+        max_size_mb: int,
+        allowed_formats: list,
+        descripcion: str,
+        resource_type: str = "raw"
+    ) -> float:
+        """
+        Valida una subida directa con los datos que reporta Cloudinary (no el cliente):
+        el tamaño real y el formato detectado por los primeros bytes.
+        Si no pasa la validación, el recurso se elimina de Cloudinary
+        
+        Returns:
+            Tamaño del archivo en MB
+        
+        Raises:
+            ArchivoMuyGrande: Si supera max_size_mb
+            TipoArchivoInvalido: Si el formato detectado no está permitido
+        """
+        size_bytes, header = await asyncio.to_thread(
+            FileService._inspeccionar_subida, public_id, secure_url, resource_type
+        )
+        size_mb = size_bytes / (1024 * 1024)
+        
+        error = None
+        if size_mb > max_size_mb:
+            error = ArchivoMuyGrande(f"Archivo muy grande. Máximo: {max_size_mb}MB")
+        else:
+            kind = filetype.guess(header)
+            if kind is None or kind.extension not in allowed_formats:
+                error = TipoArchivoInvalido(
+                    f"{descripcion} no válido. Formatos permitidos: {', '.join(allowed_formats)}"
+                )
+        
+        if error:
+            await asyncio.to_thread(FileService.delete_cloudinary_batch, [public_id], resource_type)
+            raise error
+        
+        return size_mb
+    
     @staticmethod
     def delete_local_file(file_path: str) -> bool:
         """
@@ -265,5 +529,93 @@ class FileService:
             logger.error(f"Error al eliminar archivo: {str(e)}")
             return False
 
+    @staticmethod
+    def cloudinary_public_id(url: str) -> Optional[Tuple[str, str]]:
+        """
+        Obtiene (resource_type, public_id) de una URL de Cloudinary
+        En recursos raw la extensión es parte del public_id
+        """
+        match = CLOUDINARY_URL_RE.search(url)
+        if not match:
+            return None
+        
+        resource_type, public_id = match.groups()
+        if resource_type != "raw":
+            public_id = os.path.splitext(public_id)[0]
+        
+        return resource_type, public_id
+    
+    @staticmethod
+    def delete_cloudinary_batch(public_ids: List[str], resource_type: str) -> int:
+        """Elimina hasta CLOUDINARY_DELETE_BATCH recursos en una sola llamada"""
+        try:
+            result = cloudinary.api.delete_resources(
+                public_ids,
+                resource_type=resource_type,
+                invalidate=True
+            )
+            return sum(1 for estado in result.get("deleted", {}).values() if estado == "deleted")
+        except Exception as e:
+            logger.error(f"Error al eliminar recursos de Cloudinary: {str(e)}")
+            return 0
+    
+    @staticmethod
+    async def delete_many(paths: List[str]) -> int:
+        """
+        Elimina varios archivos, locales o de Cloudinary
+        Los locales se borran en paralelo en hilos; los de Cloudinary se agrupan
+        por resource_type en llamadas de hasta 100 public_ids
+        
+        Args:
+            paths: Rutas locales (/uploads/...) o URLs de Cloudinary
+        
+        Returns:
+            Número de archivos eliminados
+        """
+        locales = []
+        por_tipo: Dict[str, List[str]] = {}
+        
+        for path in paths:
+            if not path:
+                continue
+            if path.startswith(f"/{UPLOAD_DIR}/"):
+                locales.append(path)
+                continue
+            
+            recurso = FileService.cloudinary_public_id(path)
+            if recurso:
+                resource_type, public_id = recurso
+                por_tipo.setdefault(resource_type, []).append(public_id)
+        
+        tareas = [asyncio.to_thread(FileService.delete_local_file, path) for path in locales]
+        
+        if settings.CLOUDINARY_CLOUD_NAME:
+            tareas.append(FileService.delete_cloudinary_ids(por_tipo))
+        
+        resultados = await asyncio.gather(*tareas)
+        return sum(int(r) for r in resultados)
+    
+    @staticmethod
+    async def delete_cloudinary_ids(public_ids_por_tipo: Dict[str, List[str]]) -> int:
+        """
+        Elimina public_ids de Cloudinary agrupados por resource_type
+        Se parten en lotes de CLOUDINARY_DELETE_BATCH y los lotes se envían en paralelo
+        
+        Returns:
+            Número de recursos eliminados
+        """
+        tareas = [
+            asyncio.to_thread(
+                FileService.delete_cloudinary_batch,
+                public_ids[inicio:inicio + CLOUDINARY_DELETE_BATCH],
+                resource_type
+            )
+            for resource_type, public_ids in public_ids_por_tipo.items()
+            for inicio in range(0, len(public_ids), CLOUDINARY_DELETE_BATCH)
+        ]
+        
+        resultados = await asyncio.gather(*tareas)
+        return sum(resultados)
+
 # Instancia global
 file_service = FileService()
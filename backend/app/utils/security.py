@@ -5,13 +5,40 @@ Manejo de JWT tokens y encriptación de contraseñas
 
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
+import jwt
 from passlib.context import CryptContext
 from app.config import settings
 import secrets
+import bcrypt
+import time
 
-# Contexto para hash de contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Rango de costos de bcrypt que se prueban al calibrar
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 14
+
+def _calibrar_rounds() -> int:
+    """
+    Elige el costo de bcrypt para este equipo
+    Usa BCRYPT_ROUNDS si está configurado; si no, el mayor costo entre 10 y 14
+    cuyo hash tarde como mucho BCRYPT_TARGET_MS. Cada costo duplica el tiempo,
+    así que se corta en cuanto uno se pasa del objetivo.
+    """
+    if settings.BCRYPT_ROUNDS:
+        return settings.BCRYPT_ROUNDS
+    
+    rounds = BCRYPT_MIN_ROUNDS
+    for r in range(BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS + 1):
+        inicio = time.perf_counter()
+        bcrypt.hashpw(b"calibracion", bcrypt.gensalt(r))
+        if (time.perf_counter() - inicio) * 1000 > settings.BCRYPT_TARGET_MS:
+            break
+        rounds = r
+    
+    return rounds
+
+# Contexto para hash de contraseñas (calibrado una sola vez, al importar)
+BCRYPT_ROUNDS = _calibrar_rounds()
+pwd_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=BCRYPT_ROUNDS, deprecated="auto")
 
 # ==================== PASSWORD HASHING ====================
 
@@ -25,6 +52,10 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 # ==================== JWT TOKENS ====================
 
+# Clave y algoritmos preparados una sola vez para no convertirlos en cada request
+_JWT_KEY = settings.SECRET_KEY.encode()
+_JWT_ALGORITHMS = [settings.ALGORITHM]
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Crea un token JWT de acceso
@@ -48,7 +79,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(
         to_encode,
-        settings.SECRET_KEY,
+        _JWT_KEY,
         algorithm=settings.ALGORITHM
     )
     
@@ -67,11 +98,11 @@ def decode_access_token(token: str) -> Optional[dict]:
     try:
         payload = jwt.decode(
             token,
-            settings.SECRET_KEY,
-            algorithms=[settings.ALGORITHM]
+            _JWT_KEY,
+            algorithms=_JWT_ALGORITHMS
         )
         return payload
-    except JWTError:
+    except jwt.InvalidTokenError:
         return None
 
 # ==================== TOKENS DE VERIFICACIÓN ====================
@@ -116,6 +147,9 @@ def validate_file_extension(filename: str, allowed_extensions: list) -> bool:
     extension = filename.rsplit('.', 1)[1].lower()
     return extension in allowed_extensions
 
+# Caracteres peligrosos en nombres de archivo -> "_"
+_SANITIZE_TABLE = str.maketrans({char: '_' for char in '/\\<>:"|?*'})
+
 def sanitize_filename(filename: str) -> str:
     """
     Sanitiza un nombre de archivo para evitar problemas de seguridad
@@ -126,13 +160,8 @@ def sanitize_filename(filename: str) -> str:
     Returns:
         Nombre sanitizado
     """
-    # Remueve caracteres peligrosos
-    dangerous_chars = ['/', '\\', '..', '<', '>', ':', '"', '|', '?', '*']
-    
-    for char in dangerous_chars:
-        filename = filename.replace(char, '_')
-    
-    return filename
+    # Remueve caracteres peligrosos en una sola pasada; ".." no cabe en la tabla
+    return filename.translate(_SANITIZE_TABLE).replace('..', '_')
 
 def generate_unique_filename(original_filename: str, prefix: str = "") -> str:
     """
@@ -143,22 +172,15 @@ def generate_unique_filename(original_filename: str, prefix: str = "") -> str:
         prefix: Prefijo opcional
     
     Returns:
-        Nombre único con timestamp y token aleatorio
+        Nombre único con timestamp (segundos en hex, ordenable) y token aleatorio
     """
     import os
-    from datetime import datetime
     
     # Obtener extensión
     _, ext = os.path.splitext(original_filename)
     
-    # Generar timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
-    # Token aleatorio corto
-    random_token = secrets.token_hex(4)
+    # Timestamp en hex (8 caracteres) y token aleatorio de 16 caracteres url-safe
+    token = f"{int(time.time()):08x}_{secrets.token_urlsafe(12)}"
     
     # Combinar
-    if prefix:
-        return f"{prefix}_{timestamp}_{random_token}{ext}"
-    else:
-        return f"{timestamp}_{random_token}{ext}"
+    return f"{prefix}_{token}{ext}" if prefix else f"{token}{ext}"
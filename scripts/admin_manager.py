@@ -15,9 +15,8 @@ Uso: python admin_manager.py
 
 import sys
 import os
-import re
-import json
-from typing import List, Dict, Optional
+import asyncio
+from typing import List, Dict, Iterator
 from datetime import datetime
 
 # Cargar variables de entorno
@@ -27,6 +26,9 @@ load_dotenv()
 # Agregar el directorio backend al path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
+from sqlalchemy import func, select
+from sqlalchemy.orm import load_only, selectinload
+
 from app.database import SessionLocal
 from app.models import (
     Usuario, TokenVerificacion, Resena, Compra, Juego, 
@@ -45,82 +47,57 @@ cloudinary.config(
 
 # ==================== UTILIDADES CLOUDINARY ====================
 
-def extract_public_id(url: str) -> Optional[str]:
-    """Extrae el public_id de una URL de Cloudinary"""
-    if not url or "cloudinary" not in url:
-        return None
+def delete_cloudinary_resources(urls: List[str]) -> int:
+    """
+    Elimina de Cloudinary las URLs dadas, en lotes
+    Usa FileService.delete_many del backend (public_id y resource_type salen de la URL)
+    """
+    # Import local: app.utils.files carga app.utils.security (calibra bcrypt al importar)
+    from app.utils.files import FileService
     
-    try:
-        pattern = r'/upload/(?:v\d+/)?(.+?)(?:\.\w+)?$'
-        match = re.search(pattern, url)
-        
-        if match:
-            public_id = match.group(1)
-            public_id = re.sub(r'\.\w+$', '', public_id)
-            return public_id
-        
-        return None
-    except Exception as e:
-        print(f"   ⚠️  Error extrayendo public_id de {url}: {e}")
-        return None
+    return asyncio.run(FileService.delete_many(list(dict.fromkeys(urls))))
 
-def delete_cloudinary_resource(url: str, resource_type: str = "image") -> bool:
-    """Elimina un recurso de Cloudinary"""
-    public_id = extract_public_id(url)
-    
-    if not public_id:
-        return False
-    
-    try:
-        result = cloudinary.uploader.destroy(
-            public_id,
+def _listar_recursos(folder_path: str, resource_type: str) -> Iterator[List[dict]]:
+    """
+    Recorre todos los recursos de una carpeta, página por página
+    Sigue next_cursor hasta el final (cada página trae hasta 500)
+    """
+    cursor = None
+    while True:
+        resources = cloudinary.api.resources(
+            type="upload",
+            prefix=folder_path,
             resource_type=resource_type,
-            invalidate=True
+            max_results=500,
+            next_cursor=cursor
         )
+        yield resources.get("resources", [])
         
-        if result.get("result") == "ok":
-            print(f"   ✅ Eliminado de Cloudinary: {public_id}")
-            return True
-        else:
-            print(f"   ⚠️  No se pudo eliminar: {public_id}")
-            return False
-            
-    except Exception as e:
-        print(f"   ❌ Error al eliminar {public_id}: {e}")
-        return False
+        cursor = resources.get("next_cursor")
+        if not cursor:
+            break
 
 def delete_cloudinary_folder(folder_path: str) -> int:
     """Elimina una carpeta completa de Cloudinary"""
     deleted_count = 0
+    public_ids_por_tipo = {}
     
     try:
         for resource_type in ["image", "video", "raw"]:
             try:
-                resources = cloudinary.api.resources(
-                    type="upload",
-                    prefix=folder_path,
-                    resource_type=resource_type,
-                    max_results=500
-                )
-                
-                for resource in resources.get("resources", []):
-                    public_id = resource["public_id"]
-                    
-                    try:
-                        cloudinary.uploader.destroy(
-                            public_id,
-                            resource_type=resource_type,
-                            invalidate=True
-                        )
-                        deleted_count += 1
-                        print(f"   ✅ Eliminado: {public_id}")
-                    except Exception as e:
-                        print(f"   ⚠️  Error eliminando {public_id}: {e}")
+                public_ids_por_tipo[resource_type] = [
+                    resource["public_id"]
+                    for pagina in _listar_recursos(folder_path, resource_type)
+                    for resource in pagina
+                ]
                         
             except Exception as e:
                 if "Resource not found" not in str(e):
                     pass
         
+        from app.utils.files import FileService  # import local, ver delete_cloudinary_resources
+        deleted_count = asyncio.run(FileService.delete_cloudinary_ids(public_ids_por_tipo))
+        
         try:
             cloudinary.api.delete_folder(folder_path)
             print(f"   ✅ Carpeta eliminada: {folder_path}")
@@ -134,134 +111,132 @@ def delete_cloudinary_folder(folder_path: str) -> int:
 
 # ==================== FUNCIONES DE LISTADO ====================
 
-def listar_usuarios():
+def listar_usuarios(db):
     """Muestra todos los usuarios"""
-    db = SessionLocal()
-    try:
-        usuarios = db.query(Usuario).all()
-        
-        if not usuarios:
-            print("No hay usuarios en la base de datos.")
-            return
-        
-        print("\n" + "="*90)
-        print("USUARIOS EN LA BASE DE DATOS:")
-        print("="*90)
-        print(f"{'ID':<5} {'Nombre':<20} {'Email':<30} {'Tipo':<12} {'Verificado':<10} {'Juegos':<8}")
-        print("-"*90)
-        
-        for user in usuarios:
-            verificado = "✅ Sí" if user.verificado else "❌ No"
-            num_juegos = db.query(Juego).filter(Juego.desarrollador_id == user.id).count()
-            print(f"{user.id:<5} {user.nombre[:18]:<20} {user.email[:28]:<30} {user.tipo_cuenta:<12} {verificado:<10} {num_juegos:<8}")
-        
-        print("="*90 + "\n")
-        
-    finally:
-        db.close()
+    # Usuarios con su número de juegos en una sola consulta
+    usuarios = (
+        db.query(Usuario, func.count(Juego.id))
+        .outerjoin(Juego, Juego.desarrollador_id == Usuario.id)
+        .group_by(Usuario.id)
+        .all()
+    )
+    
+    if not usuarios:
+        print("No hay usuarios en la base de datos.")
+        return
+    
+    # La tabla se arma completa y se escribe de una vez
+    lineas = [
+        "",
+        "="*90,
+        "USUARIOS EN LA BASE DE DATOS:",
+        "="*90,
+        f"{'ID':<5} {'Nombre':<20} {'Email':<30} {'Tipo':<12} {'Verificado':<10} {'Juegos':<8}",
+        "-"*90
+    ]
+    lineas.extend(
+        f"{user.id:<5} {user.nombre[:18]:<20} {user.email[:28]:<30} {user.tipo_cuenta:<12} "
+        f"{'✅ Sí' if user.verificado else '❌ No':<10} {num_juegos:<8}"
+        for user, num_juegos in usuarios
+    )
+    lineas.append("="*90 + "\n")
+    
+    sys.stdout.write("\n".join(lineas) + "\n")
 
-def listar_juegos(filtro_usuario_id: int = None):
+def listar_juegos(db, filtro_usuario_id: int = None):
     """Muestra todos los juegos, opcionalmente filtrados por usuario"""
-    db = SessionLocal()
-    try:
-        query = db.query(Juego)
-        if filtro_usuario_id:
-            query = query.filter(Juego.desarrollador_id == filtro_usuario_id)
-        
-        juegos = query.all()
-        
-        if not juegos:
-            print("No hay juegos que mostrar.")
-            return
-        
-        print("\n" + "="*100)
-        print("JUEGOS EN LA BASE DE DATOS:")
-        print("="*100)
-        print(f"{'ID':<5} {'Título':<30} {'Desarrollador':<20} {'Precio':<10} {'Estado':<12} {'Descargas':<10}")
-        print("-"*100)
-        
-        for juego in juegos:
-            dev_name = juego.desarrollador.nombre if juego.desarrollador else "Desconocido"
-            precio_str = f"${juego.precio:.2f}" if juego.precio else "GRATIS"
-            print(f"{juego.id:<5} {juego.titulo[:28]:<30} {dev_name[:18]:<20} {precio_str:<10} {juego.estado.value:<12} {juego.total_descargas or 0:<10}")
-        
-        print("="*100 + "\n")
-        
-    finally:
-        db.close()
+    # Solo las columnas que se muestran; los desarrolladores en un solo SELECT ... IN
+    query = db.query(Juego).options(
+        load_only(
+            Juego.id, Juego.titulo, Juego.precio, Juego.estado,
+            Juego.total_descargas, Juego.desarrollador_id
+        ),
+        selectinload(Juego.desarrollador).load_only(Usuario.nombre)
+    )
+    if filtro_usuario_id:
+        query = query.filter(Juego.desarrollador_id == filtro_usuario_id)
+    
+    juegos = query.all()
+    
+    if not juegos:
+        print("No hay juegos que mostrar.")
+        return
+    
+    # La tabla se arma completa y se escribe de una vez
+    lineas = [
+        "",
+        "="*100,
+        "JUEGOS EN LA BASE DE DATOS:",
+        "="*100,
+        f"{'ID':<5} {'Título':<30} {'Desarrollador':<20} {'Precio':<10} {'Estado':<12} {'Descargas':<10}",
+        "-"*100
+    ]
+    for juego in juegos:
+        dev_name = juego.desarrollador.nombre if juego.desarrollador else "Desconocido"
+        precio_str = f"${juego.precio:.2f}" if juego.precio else "GRATIS"
+        lineas.append(f"{juego.id:<5} {juego.titulo[:28]:<30} {dev_name[:18]:<20} {precio_str:<10} {juego.estado.value:<12} {juego.total_descargas or 0:<10}")
+    lineas.append("="*100 + "\n")
+    
+    sys.stdout.write("\n".join(lineas) + "\n")
 
 # ==================== FUNCIONES DE CONTEO ====================
 
+def _contar(db, **conteos) -> Dict[str, int]:
+    """
+    Ejecuta varios COUNT(*) en un solo SELECT de subconsultas escalares
+    Cada argumento es (modelo, condición) y da nombre a su conteo
+    """
+    columnas = [
+        select(func.count()).select_from(modelo).where(condicion).scalar_subquery().label(nombre)
+        for nombre, (modelo, condicion) in conteos.items()
+    ]
+    return dict(db.execute(select(*columnas)).one()._mapping)
+
 def contar_relaciones_usuario(user_id: int, db) -> Dict[str, int]:
     """Cuenta registros relacionados de un usuario"""
-    return {
-        'tokens': db.query(TokenVerificacion).filter(TokenVerificacion.usuario_id == user_id).count(),
-        'resenas': db.query(Resena).filter(Resena.usuario_id == user_id).count(),
-        'compras': db.query(Compra).filter(Compra.usuario_id == user_id).count(),
-        'juegos': db.query(Juego).filter(Juego.desarrollador_id == user_id).count(),
-        'carrito': db.query(CarritoItem).filter(CarritoItem.usuario_id == user_id).count(),
-        'biblioteca': db.query(BibliotecaItem).filter(BibliotecaItem.usuario_id == user_id).count(),
-        'descargas': db.query(DescargaLog).filter(DescargaLog.usuario_id == user_id).count()
-    }
+    return _contar(
+        db,
+        tokens=(TokenVerificacion, TokenVerificacion.usuario_id == user_id),
+        resenas=(Resena, Resena.usuario_id == user_id),
+        compras=(Compra, Compra.usuario_id == user_id),
+        juegos=(Juego, Juego.desarrollador_id == user_id),
+        carrito=(CarritoItem, CarritoItem.usuario_id == user_id),
+        biblioteca=(BibliotecaItem, BibliotecaItem.usuario_id == user_id),
+        descargas=(DescargaLog, DescargaLog.usuario_id == user_id)
+    )
 
 def contar_relaciones_juego(juego_id: int, db) -> Dict[str, int]:
     """Cuenta registros relacionados de un juego"""
-    return {
-        'resenas': db.query(Resena).filter(Resena.juego_id == juego_id).count(),
-        'items_compra': db.query(ItemCompra).filter(ItemCompra.juego_id == juego_id).count(),
-        'carrito': db.query(CarritoItem).filter(CarritoItem.juego_id == juego_id).count(),
-        'biblioteca': db.query(BibliotecaItem).filter(BibliotecaItem.juego_id == juego_id).count(),
-        'descargas': db.query(DescargaLog).filter(DescargaLog.juego_id == juego_id).count()
-    }
+    return _contar(
+        db,
+        resenas=(Resena, Resena.juego_id == juego_id),
+        items_compra=(ItemCompra, ItemCompra.juego_id == juego_id),
+        carrito=(CarritoItem, CarritoItem.juego_id == juego_id),
+        biblioteca=(BibliotecaItem, BibliotecaItem.juego_id == juego_id),
+        descargas=(DescargaLog, DescargaLog.juego_id == juego_id)
+    )
 
 # ==================== FUNCIONES DE ELIMINACIÓN ====================
 
-def eliminar_archivos_juego(juego: Juego) -> int:
-    """Elimina los archivos de Cloudinary de un juego"""
-    eliminados = 0
-    
-    # Portada
-    if juego.portada_url and "cloudinary" in juego.portada_url:
-        if delete_cloudinary_resource(juego.portada_url):
-            eliminados += 1
-    
-    # Screenshots
-    if juego.screenshots_urls:
-        try:
-            screenshots = json.loads(juego.screenshots_urls) if isinstance(juego.screenshots_urls, str) else juego.screenshots_urls
-            for url in screenshots:
-                if url and "cloudinary" in url:
-                    if delete_cloudinary_resource(url):
-                        eliminados += 1
-        except:
-            pass
-    
-    # Trailer (video)
-    if juego.trailer_url and "cloudinary" in juego.trailer_url:
-        if delete_cloudinary_resource(juego.trailer_url, "video"):
-            eliminados += 1
-    
-    # Archivo del juego
-    if juego.archivo_juego_url and "cloudinary" in juego.archivo_juego_url:
-        if delete_cloudinary_resource(juego.archivo_juego_url, "raw"):
-            eliminados += 1
-    
-    return eliminados
+# Columnas de Juego que archivos_juego necesita
+COLUMNAS_ARCHIVOS = (Juego.portada_url, Juego.screenshots_urls, Juego.trailer_url, Juego.archivo_juego_url)
+
+def archivos_juego(juego: Juego) -> List[str]:
+    """
+    Reúne las URLs de Cloudinary de un juego
+    No elimina nada: se borran en lote con delete_cloudinary_resources
+    """
+    urls = [juego.portada_url, *(juego.screenshots_urls or []), juego.trailer_url, juego.archivo_juego_url]
+    return [url for url in urls if url and "cloudinary" in url]
 
-def eliminar_juego(juego_id: int, confirmar: bool = True) -> bool:
+def eliminar_juego(juego_id: int, db, confirmar: bool = True) -> bool:
     """
     Elimina un juego específico con todas sus relaciones.
     
-    ORDEN DE ELIMINACIÓN (hijos antes que padre):
-    1. Reseñas del juego
-    2. Items de compra que incluyan el juego
-    3. Items de carrito
-    4. Items de biblioteca
-    5. Registros de descarga
-    6. Archivos en Cloudinary
-    7. El juego
+    Reseñas, items de compra, carrito, biblioteca y registros de descarga
+    los elimina MySQL (ON DELETE CASCADE) al borrar el juego con un solo DELETE.
+    Después se eliminan sus archivos en Cloudinary.
     """
-    db = SessionLocal()
     try:
         juego = db.query(Juego).filter(Juego.id == juego_id).first()
         
@@ -291,53 +266,40 @@ def eliminar_juego(juego_id: int, confirmar: bool = True) -> bool:
         
         print("\n🗑️  Eliminando registros...")
         
-        # 1. Eliminar reseñas
-        if relaciones['resenas'] > 0:
-            db.query(Resena).filter(Resena.juego_id == juego_id).delete()
-            print(f"   ✅ {relaciones['resenas']} reseñas eliminadas")
-        
-        # 2. Eliminar items de compra
-        if relaciones['items_compra'] > 0:
-            db.query(ItemCompra).filter(ItemCompra.juego_id == juego_id).delete()
-            print(f"   ✅ {relaciones['items_compra']} items de compra eliminados")
+        # Reunir archivos de Cloudinary antes de borrar la fila
+        urls = archivos_juego(juego)
+        titulo = juego.titulo
         
-        # 3. Eliminar items de carrito
-        if relaciones['carrito'] > 0:
-            db.query(CarritoItem).filter(CarritoItem.juego_id == juego_id).delete()
-            print(f"   ✅ {relaciones['carrito']} items de carrito eliminados")
-        
-        # 4. Eliminar items de biblioteca
-        if relaciones['biblioteca'] > 0:
-            db.query(BibliotecaItem).filter(BibliotecaItem.juego_id == juego_id).delete()
-            print(f"   ✅ {relaciones['biblioteca']} items de biblioteca eliminados")
+        # El juego; sus relaciones caen en cascada
+        db.query(Juego).filter(Juego.id == juego_id).delete(synchronize_session=False)
+        db.commit()
         
-        # 5. Eliminar registros de descarga
-        if relaciones['descargas'] > 0:
-            db.query(DescargaLog).filter(DescargaLog.juego_id == juego_id).delete()
-            print(f"   ✅ {relaciones['descargas']} registros de descarga eliminados")
+        print(f"   ✅ {relaciones['resenas']} reseñas eliminadas")
+        print(f"   ✅ {relaciones['items_compra']} items de compra eliminados")
+        print(f"   ✅ {relaciones['carrito']} items de carrito eliminados")
+        print(f"   ✅ {relaciones['biblioteca']} items de biblioteca eliminados")
+        print(f"   ✅ {relaciones['descargas']} registros de descarga eliminados")
         
-        # 6. Eliminar archivos de Cloudinary
+        # Los archivos se borran en lote una vez confirmada la transacción
         print("\n☁️  Eliminando archivos de Cloudinary...")
-        archivos_eliminados = eliminar_archivos_juego(juego)
+        archivos_eliminados = delete_cloudinary_resources(urls)
         print(f"   ✅ {archivos_eliminados} archivos eliminados")
         
-        # 7. Eliminar el juego
-        db.delete(juego)
-        db.commit()
-        
-        print(f"\n✅✅✅ Juego '{juego.titulo}' eliminado completamente")
+        print(f"\n✅✅✅ Juego '{titulo}' eliminado completamente")
         return True
         
     except Exception as e:
         print(f"\n❌ Error al eliminar juego: {e}")
         db.rollback()
         return False
-    finally:
-        db.close()
 
-def eliminar_juegos_de_usuario(user_id: int) -> bool:
-    """Elimina SOLO los juegos de un usuario (mantiene la cuenta)"""
-    db = SessionLocal()
+def eliminar_juegos_de_usuario(user_id: int, db) -> bool:
+    """
+    Elimina SOLO los juegos de un usuario (mantiene la cuenta)
+    
+    Todos sus juegos se borran con un solo DELETE (sus relaciones caen en cascada)
+    y una sola transacción; después se eliminan en lote sus archivos de Cloudinary.
+    """
     try:
         usuario = db.query(Usuario).filter(Usuario.id == user_id).first()
         
@@ -345,7 +307,13 @@ def eliminar_juegos_de_usuario(user_id: int) -> bool:
             print(f"❌ No se encontró el usuario con ID {user_id}")
             return False
         
-        juegos = db.query(Juego).filter(Juego.desarrollador_id == user_id).all()
+        # Solo id, título y columnas de URLs, en una consulta
+        juegos = (
+            db.query(Juego)
+            .filter(Juego.desarrollador_id == user_id)
+            .options(load_only(Juego.id, Juego.titulo, *COLUMNAS_ARCHIVOS))
+            .all()
+        )
         
         if not juegos:
             print(f"ℹ️  El usuario {usuario.nombre} no tiene juegos publicados")
@@ -363,39 +331,46 @@ def eliminar_juegos_de_usuario(user_id: int) -> bool:
             print("❌ Operación cancelada")
             return False
         
-        eliminados = 0
+        print("\n🗑️  Eliminando registros...")
+        
+        # Reunir archivos de Cloudinary antes de borrar las filas
+        urls: List[str] = []
         for juego in juegos:
-            print(f"\n--- Eliminando: {juego.titulo} ---")
-            if eliminar_juego(juego.id, confirmar=False):
-                eliminados += 1
+            urls.extend(archivos_juego(juego))
+        nombre = usuario.nombre
+        
+        # Los juegos; reseñas, items de compra, carrito, biblioteca y descargas caen en cascada
+        eliminados = (
+            db.query(Juego)
+            .filter(Juego.desarrollador_id == user_id)
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        print(f"   ✅ {eliminados} juegos eliminados")
         
-        print(f"\n✅✅✅ {eliminados}/{len(juegos)} juegos eliminados")
-        print(f"      La cuenta del usuario '{usuario.nombre}' se mantiene activa")
+        # Los archivos se borran en lote una vez confirmada la transacción
+        print("\n☁️  Eliminando archivos de Cloudinary...")
+        archivos_eliminados = delete_cloudinary_resources(urls)
+        print(f"   ✅ {archivos_eliminados} archivos eliminados")
+        
+        print(f"\n✅✅✅ {eliminados} juegos eliminados")
+        print(f"      La cuenta del usuario '{nombre}' se mantiene activa")
         return True
         
     except Exception as e:
         print(f"\n❌ Error: {e}")
+        db.rollback()
         return False
-    finally:
-        db.close()
 
-def eliminar_usuario_completo(user_id: int) -> bool:
+def eliminar_usuario_completo(user_id: int, db) -> bool:
     """
     Elimina un usuario con TODAS sus relaciones.
     
-    ORDEN DE ELIMINACIÓN (hijos antes que padre):
-    1. Tokens de verificación
-    2. Reseñas escritas por el usuario
-    3. Items de carrito
-    4. Items de biblioteca
-    5. Registros de descarga
-    6. Items de compra
-    7. Compras
-    8. Juegos publicados (con sus relaciones)
-    9. Avatar en Cloudinary
-    10. El usuario
+    Tokens, reseñas, carrito, biblioteca, descargas y compras (con sus items)
+    los elimina MySQL (ON DELETE CASCADE) al borrar el usuario. Los juegos
+    publicados se borran antes con un solo DELETE, también en cascada.
+    Al final se eliminan en lote los archivos de Cloudinary y el avatar.
     """
-    db = SessionLocal()
     try:
         usuario = db.query(Usuario).filter(Usuario.id == user_id).first()
         
@@ -427,80 +402,54 @@ def eliminar_usuario_completo(user_id: int) -> bool:
         
         print("\n🗑️  Eliminando registros...")
         
-        # 1. Tokens
-        if relaciones['tokens'] > 0:
-            db.query(TokenVerificacion).filter(TokenVerificacion.usuario_id == user_id).delete()
-            print(f"   ✅ {relaciones['tokens']} tokens eliminados")
-        
-        # 2. Reseñas del usuario
-        if relaciones['resenas'] > 0:
-            db.query(Resena).filter(Resena.usuario_id == user_id).delete()
-            print(f"   ✅ {relaciones['resenas']} reseñas eliminadas")
-        
-        # 3. Items de carrito
-        if relaciones['carrito'] > 0:
-            db.query(CarritoItem).filter(CarritoItem.usuario_id == user_id).delete()
-            print(f"   ✅ {relaciones['carrito']} items de carrito eliminados")
-        
-        # 4. Items de biblioteca
-        if relaciones['biblioteca'] > 0:
-            db.query(BibliotecaItem).filter(BibliotecaItem.usuario_id == user_id).delete()
-            print(f"   ✅ {relaciones['biblioteca']} items de biblioteca eliminados")
-        
-        # 5. Registros de descarga
-        if relaciones['descargas'] > 0:
-            db.query(DescargaLog).filter(DescargaLog.usuario_id == user_id).delete()
-            print(f"   ✅ {relaciones['descargas']} registros de descarga eliminados")
-        
-        # 6-7. Compras y sus items
-        if relaciones['compras'] > 0:
-            # Primero eliminar items de compra
-            compras_ids = [c.id for c in db.query(Compra).filter(Compra.usuario_id == user_id).all()]
-            for compra_id in compras_ids:
-                db.query(ItemCompra).filter(ItemCompra.compra_id == compra_id).delete()
-            db.query(Compra).filter(Compra.usuario_id == user_id).delete()
-            print(f"   ✅ {relaciones['compras']} compras eliminadas")
-        
-        # 8. Juegos publicados
+        # 1. Juegos publicados: reunir sus archivos (solo las columnas de URLs,
+        #    en una consulta) y borrarlos con un solo DELETE
+        urls: List[str] = []
         if relaciones['juegos'] > 0:
-            juegos = db.query(Juego).filter(Juego.desarrollador_id == user_id).all()
+            juegos = (
+                db.query(Juego)
+                .filter(Juego.desarrollador_id == user_id)
+                .options(load_only(*COLUMNAS_ARCHIVOS))
+                .all()
+            )
             for juego in juegos:
-                # Eliminar relaciones del juego
-                db.query(Resena).filter(Resena.juego_id == juego.id).delete()
-                db.query(ItemCompra).filter(ItemCompra.juego_id == juego.id).delete()
-                db.query(CarritoItem).filter(CarritoItem.juego_id == juego.id).delete()
-                db.query(BibliotecaItem).filter(BibliotecaItem.juego_id == juego.id).delete()
-                db.query(DescargaLog).filter(DescargaLog.juego_id == juego.id).delete()
-                
-                # Eliminar archivos de Cloudinary
-                eliminar_archivos_juego(juego)
-                
-                # Eliminar el juego
-                db.delete(juego)
-            print(f"   ✅ {relaciones['juegos']} juegos eliminados")
+                urls.extend(archivos_juego(juego))
+            
+            db.query(Juego).filter(Juego.desarrollador_id == user_id).delete(synchronize_session=False)
         
-        # 9. Avatar en Cloudinary
+        # 2. Avatar en Cloudinary
         if usuario.avatar_url and "cloudinary" in usuario.avatar_url:
-            delete_cloudinary_resource(usuario.avatar_url)
-            print("   ✅ Avatar eliminado de Cloudinary")
+            urls.append(usuario.avatar_url)
+        nombre = usuario.nombre
         
-        # 10. El usuario
-        db.delete(usuario)
+        # 3. El usuario; el resto de sus registros cae en cascada
+        db.query(Usuario).filter(Usuario.id == user_id).delete(synchronize_session=False)
         db.commit()
         
-        print(f"\n✅✅✅ Usuario '{usuario.nombre}' completamente eliminado")
+        print(f"   ✅ {relaciones['tokens']} tokens eliminados")
+        print(f"   ✅ {relaciones['resenas']} reseñas eliminadas")
+        print(f"   ✅ {relaciones['carrito']} items de carrito eliminados")
+        print(f"   ✅ {relaciones['biblioteca']} items de biblioteca eliminados")
+        print(f"   ✅ {relaciones['descargas']} registros de descarga eliminados")
+        print(f"   ✅ {relaciones['compras']} compras eliminadas")
+        print(f"   ✅ {relaciones['juegos']} juegos eliminados")
+        
+        # Archivos de los juegos y avatar, en lote
+        if urls:
+            print("\n☁️  Eliminando archivos de Cloudinary...")
+            archivos_eliminados = delete_cloudinary_resources(urls)
+            print(f"   ✅ {archivos_eliminados} archivos eliminados")
+        
+        print(f"\n✅✅✅ Usuario '{nombre}' completamente eliminado")
         return True
         
     except Exception as e:
         print(f"\n❌ Error al eliminar usuario: {e}")
         db.rollback()
         return False
-    finally:
-        db.close()
 
-def limpiar_usuarios_no_verificados():
+def limpiar_usuarios_no_verificados(db):
     """Elimina todos los usuarios no verificados"""
-    db = SessionLocal()
     try:
         usuarios = db.query(Usuario).filter(Usuario.verificado == False).all()
         
@@ -517,29 +466,20 @@ def limpiar_usuarios_no_verificados():
             print("❌ Operación cancelada")
             return
         
-        eliminados = 0
-        for user in usuarios:
-            print(f"\n--- Eliminando: {user.nombre} ---")
-            
-            # Eliminar tokens
-            db.query(TokenVerificacion).filter(TokenVerificacion.usuario_id == user.id).delete()
-            
-            # Eliminar avatar si existe
-            if user.avatar_url and "cloudinary" in user.avatar_url:
-                delete_cloudinary_resource(user.avatar_url)
-            
-            # Eliminar usuario
-            db.delete(user)
-            eliminados += 1
+        usuarios_ids = [user.id for user in usuarios]
+        avatares = [user.avatar_url for user in usuarios if user.avatar_url and "cloudinary" in user.avatar_url]
         
+        # Un solo DELETE; sus tokens caen en cascada
+        eliminados = db.query(Usuario).filter(Usuario.id.in_(usuarios_ids)).delete(synchronize_session=False)
         db.commit()
+        
+        if avatares:
+            delete_cloudinary_resources(avatares)
         print(f"\n✅✅✅ {eliminados} usuarios no verificados eliminados")
         
     except Exception as e:
         print(f"❌ Error: {e}")
         db.rollback()
-    finally:
-        db.close()
 
 # ==================== MENÚ INTERACTIVO ====================
 
@@ -561,53 +501,56 @@ def menu_principal():
         
         opcion = input("\nSelecciona una opción (1-8): ").strip()
         
-        if opcion == '1':
-            listar_usuarios()
-            
-        elif opcion == '2':
-            listar_juegos()
-            
-        elif opcion == '3':
-            listar_juegos()
-            try:
-                juego_id = int(input("\nID del juego a eliminar: "))
-                eliminar_juego(juego_id)
-            except ValueError:
-                print("❌ ID inválido")
+        # Una sesión por operación: el listado previo y la eliminación comparten
+        # conexión y mapa de identidad (el Usuario listado no se vuelve a consultar)
+        with SessionLocal() as db:
+            if opcion == '1':
+                listar_usuarios(db)
                 
-        elif opcion == '4':
-            listar_usuarios()
-            try:
-                user_id = int(input("\nID del usuario: "))
-                eliminar_juegos_de_usuario(user_id)
-            except ValueError:
-                print("❌ ID inválido")
+            elif opcion == '2':
+                listar_juegos(db)
                 
-        elif opcion == '5':
-            listar_usuarios()
-            try:
-                user_id = int(input("\nID del usuario a eliminar COMPLETAMENTE: "))
-                eliminar_usuario_completo(user_id)
-            except ValueError:
-                print("❌ ID inválido")
+            elif opcion == '3':
+                listar_juegos(db)
+                try:
+                    juego_id = int(input("\nID del juego a eliminar: "))
+                    eliminar_juego(juego_id, db)
+                except ValueError:
+                    print("❌ ID inválido")
+                    
+            elif opcion == '4':
+                listar_usuarios(db)
+                try:
+                    user_id = int(input("\nID del usuario: "))
+                    eliminar_juegos_de_usuario(user_id, db)
+                except ValueError:
+                    print("❌ ID inválido")
+                    
+            elif opcion == '5':
+                listar_usuarios(db)
+                try:
+                    user_id = int(input("\nID del usuario a eliminar COMPLETAMENTE: "))
+                    eliminar_usuario_completo(user_id, db)
+                except ValueError:
+                    print("❌ ID inválido")
+                    
+            elif opcion == '6':
+                limpiar_usuarios_no_verificados(db)
                 
-        elif opcion == '6':
-            limpiar_usuarios_no_verificados()
-            
-        elif opcion == '7':
-            listar_usuarios()
-            try:
-                user_id = int(input("\nID del usuario: "))
-                listar_juegos(filtro_usuario_id=user_id)
-            except ValueError:
-                print("❌ ID inválido")
+            elif opcion == '7':
+                listar_usuarios(db)
+                try:
+                    user_id = int(input("\nID del usuario: "))
+                    listar_juegos(db, filtro_usuario_id=user_id)
+                except ValueError:
+                    print("❌ ID inválido")
+                    
+            elif opcion == '8':
+                print("\n👋 ¡Hasta luego!")
+                break
                 
-        elif opcion == '8':
-            print("\n👋 ¡Hasta luego!")
-            break
-            
-        else:
-            print("❌ Opción inválida")
+            else:
+                print("❌ Opción inválida")
 
 if __name__ == "__main__":
     print("""
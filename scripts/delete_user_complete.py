@@ -7,9 +7,9 @@ Uso: python delete_user_complete.py
 
 import sys
 import os
-import re
-import json
-from typing import List, Dict, Optional
+import asyncio
+from typing import List, Dict, Tuple
+from functools import lru_cache
 
 # Cargar variables de entorno
 from dotenv import load_dotenv
@@ -18,81 +18,40 @@ load_dotenv()
 # Agregar el directorio backend al path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
+from sqlalchemy import func, select
+
 from app.database import SessionLocal
 from app.models import Usuario, TokenVerificacion, Resena, Compra, Juego, CarritoItem, BibliotecaItem, DescargaLog
 import cloudinary
-import cloudinary.uploader
 import cloudinary.api
 
-# Configurar Cloudinary
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET")
-)
-
 # ==================== UTILIDADES CLOUDINARY ====================
 
-def extract_public_id(url: str) -> Optional[str]:
-    """
-    Extrae el public_id de una URL de Cloudinary
-    
-    Ejemplos:
-    https://res.cloudinary.com/dikxre04b/image/upload/v123/pyxolotl/avatares/foto.jpg
-    -> pyxolotl/avatares/foto
-    """
-    if not url or "cloudinary" not in url:
-        return None
-    
-    try:
-        # Patrón: después de /upload/vXXX/ o /upload/
-        pattern = r'/upload/(?:v\d+/)?(.+?)(?:\.\w+)?$'
-        match = re.search(pattern, url)
-        
-        if match:
-            public_id = match.group(1)
-            # Remover extensión si quedó
-            public_id = re.sub(r'\.\w+$', '', public_id)
-            return public_id
-        
-        return None
-    except Exception as e:
-        print(f"   ⚠️  Error extrayendo public_id de {url}: {e}")
-        return None
+@lru_cache(maxsize=1)
+def _configure_cloudinary():
+    """Configura Cloudinary la primera vez que se usa (importar el script no lo toca)"""
+    cloudinary.config(
+        cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+        api_key=os.getenv("CLOUDINARY_API_KEY"),
+        api_secret=os.getenv("CLOUDINARY_API_SECRET")
+    )
 
-def delete_cloudinary_resource(url: str, resource_type: str = "image") -> bool:
+def delete_cloudinary_resources(urls_por_tipo: Dict[str, List[str]]) -> int:
     """
-    Elimina un recurso de Cloudinary
-    
-    Args:
-        url: URL del recurso
-        resource_type: Tipo (image, video, raw)
+    Elimina de Cloudinary las URLs agrupadas por resource_type (image, video, raw)
+    Usa FileService.delete_many del backend: public_id y resource_type salen de la URL
+    y se eliminan en lotes paralelos de hasta 100
     
     Returns:
-        True si se eliminó exitosamente
+        Número de recursos eliminados
     """
-    public_id = extract_public_id(url)
-    
-    if not public_id:
-        return False
+    _configure_cloudinary()
+    # Import local: app.utils.files carga app.utils.security (calibra bcrypt al importar)
+    from app.utils.files import FileService
     
-    try:
-        result = cloudinary.uploader.destroy(
-            public_id,
-            resource_type=resource_type,
-            invalidate=True
-        )
-        
-        if result.get("result") == "ok":
-            print(f"   ✅ Eliminado de Cloudinary: {public_id}")
-            return True
-        else:
-            print(f"   ⚠️  No se pudo eliminar: {public_id} - {result}")
-            return False
-            
-    except Exception as e:
-        print(f"   ❌ Error al eliminar {public_id}: {e}")
-        return False
+    # Cada recurso una sola vez, aunque su URL aparezca en varias filas
+    urls = list(dict.fromkeys(url for lista in urls_por_tipo.values() for url in lista))
+    return asyncio.run(FileService.delete_many(urls))
 
 def delete_cloudinary_folder(folder_path: str) -> int:
     """
@@ -104,37 +63,32 @@ def delete_cloudinary_folder(folder_path: str) -> int:
     Returns:
         Número de archivos eliminados
     """
+    _configure_cloudinary()
     deleted_count = 0
     
     try:
-        # Obtener todos los recursos en la carpeta
+        # Cloudinary lista y elimina los recursos del prefijo del lado del servidor
+        # (con "/" final para no tocar carpetas hermanas, ej: juegos/1 vs juegos/12)
         for resource_type in ["image", "video", "raw"]:
             try:
-                resources = cloudinary.api.resources(
-                    type="upload",
-                    prefix=folder_path,
-                    resource_type=resource_type,
-                    max_results=500
-                )
-                
-                for resource in resources.get("resources", []):
-                    public_id = resource["public_id"]
+                opciones = {"resource_type": resource_type, "invalidate": True}
+                while True:
+                    result = cloudinary.api.delete_resources_by_prefix(f"{folder_path}/", **opciones)
                     
-                    try:
-                        cloudinary.uploader.destroy(
-                            public_id,
-                            resource_type=resource_type,
-                            invalidate=True
-                        )
-                        deleted_count += 1
-                        print(f"   ✅ Eliminado: {public_id}")
-                    except Exception as e:
-                        print(f"   ⚠️  Error eliminando {public_id}: {e}")
+                    for public_id, estado in result.get("deleted", {}).items():
+                        if estado == "deleted":
+                            deleted_count += 1
+                            print(f"   ✅ Eliminado: {public_id}")
+                    
+                    # Cada llamada borra hasta 1000; si quedan, responde partial + next_cursor
+                    if not (result.get("partial") and result.get("next_cursor")):
+                        break
+                    opciones["next_cursor"] = result["next_cursor"]
                         
             except Exception as e:
                 # Es normal si no hay recursos de ese tipo
                 if "Resource not found" not in str(e):
-                    print(f"   ⚠️  Error buscando {resource_type} en {folder_path}: {e}")
+                    print(f"   ⚠️  Error eliminando {resource_type} en {folder_path}: {e}")
         
         # Intentar eliminar la carpeta vacía
         try:
@@ -155,105 +109,150 @@ def listar_usuarios():
     """Muestra todos los usuarios en la base de datos"""
     db = SessionLocal()
     try:
-        usuarios = db.query(Usuario).all()
+        # Solo las columnas que se muestran, en lotes de 500 filas desde el servidor
+        usuarios = db.execute(
+            select(Usuario.id, Usuario.nombre, Usuario.email, Usuario.tipo_cuenta, Usuario.verificado)
+            .order_by(Usuario.id)
+            .execution_options(yield_per=500)
+        )
+        
+        filas = [
+            f"{user.id:<5} {user.nombre:<25} {user.email:<30} {user.tipo_cuenta:<15} "
+            f"{'✅ Sí' if user.verificado else '❌ No':<10}"
+            for user in usuarios
+        ]
         
-        if not usuarios:
+        if not filas:
             print("No hay usuarios en la base de datos.")
             return
         
-        print("\n" + "="*80)
-        print("USUARIOS EN LA BASE DE DATOS:")
-        print("="*80)
-        print(f"{'ID':<5} {'Nombre':<25} {'Email':<30} {'Tipo':<15} {'Verificado':<10}")
-        print("-"*80)
-        
-        for user in usuarios:
-            verificado = "✅ Sí" if user.verificado else "❌ No"
-            print(f"{user.id:<5} {user.nombre:<25} {user.email:<30} {user.tipo_cuenta:<15} {verificado:<10}")
-        
-        print("="*80 + "\n")
+        # La tabla se arma completa y se escribe de una vez
+        lineas = [
+            "",
+            "="*80,
+            "USUARIOS EN LA BASE DE DATOS:",
+            "="*80,
+            f"{'ID':<5} {'Nombre':<25} {'Email':<30} {'Tipo':<15} {'Verificado':<10}",
+            "-"*80,
+            *filas,
+            "="*80 + "\n"
+        ]
+        sys.stdout.write("\n".join(lineas) + "\n")
         
     finally:
         db.close()
 
 def contar_relaciones(user_id: int, db) -> Dict[str, int]:
-    """Cuenta cuántos registros relacionados tiene el usuario"""
-    return {
-        'tokens': db.query(TokenVerificacion).filter(TokenVerificacion.usuario_id == user_id).count(),
-        'resenas': db.query(Resena).filter(Resena.usuario_id == user_id).count(),
-        'compras': db.query(Compra).filter(Compra.usuario_id == user_id).count(),
-        'juegos': db.query(Juego).filter(Juego.desarrollador_id == user_id).count(),
-        'carrito': db.query(CarritoItem).filter(CarritoItem.usuario_id == user_id).count(),
-        'biblioteca': db.query(BibliotecaItem).filter(BibliotecaItem.usuario_id == user_id).count(),
-        'descargas': db.query(DescargaLog).filter(DescargaLog.usuario_id == user_id).count()
+    """Cuenta cuántos registros relacionados tiene el usuario (un solo SELECT)"""
+    conteos = {
+        'tokens': (TokenVerificacion, TokenVerificacion.usuario_id == user_id),
+        'resenas': (Resena, Resena.usuario_id == user_id),
+        'compras': (Compra, Compra.usuario_id == user_id),
+        'juegos': (Juego, Juego.desarrollador_id == user_id),
+        'carrito': (CarritoItem, CarritoItem.usuario_id == user_id),
+        'biblioteca': (BibliotecaItem, BibliotecaItem.usuario_id == user_id),
+        'descargas': (DescargaLog, DescargaLog.usuario_id == user_id)
     }
+    columnas = [
+        select(func.count()).select_from(modelo).where(condicion).scalar_subquery().label(nombre)
+        for nombre, (modelo, condicion) in conteos.items()
+    ]
+    return dict(db.execute(select(*columnas)).one()._mapping)
 
-def obtener_archivos_cloudinary_usuario(user_id: int, db) -> Dict[str, List[str]]:
-    """
-    Obtiene todas las URLs de Cloudinary asociadas al usuario
-    
-    Returns:
-        Dict con listas de URLs por tipo de recurso
-    """
-    archivos = {
+def _archivos_vacios() -> Dict[str, List[str]]:
+    """Listas de URLs por tipo de recurso, vacías"""
+    return {
         'avatar': [],
         'juegos_imagenes': [],
         'juegos_videos': [],
         'juegos_archivos': [],
         'recibos': []
     }
+
+def obtener_archivos_cloudinary_usuarios(
+    user_ids: List[int], db
+) -> Tuple[Dict[int, Dict[str, List[str]]], Dict[int, List[int]]]:
+    """
+    Obtiene las URLs de Cloudinary y los IDs de juegos de varios usuarios
+    Una consulta por tabla (WHERE ... IN), agrupada después por usuario
+    
+    Returns:
+        Tupla (URLs por tipo de recurso de cada usuario, IDs de juegos de cada usuario)
+    """
+    archivos = {user_id: _archivos_vacios() for user_id in user_ids}
+    juegos_ids: Dict[int, List[int]] = {user_id: [] for user_id in user_ids}
     
-    # 1. Avatar del usuario
-    usuario = db.query(Usuario).filter(Usuario.id == user_id).first()
-    if usuario and usuario.avatar_url and "cloudinary" in usuario.avatar_url:
-        archivos['avatar'].append(usuario.avatar_url)
+    # 1. Avatares
+    avatares = db.execute(
+        select(Usuario.id, Usuario.avatar_url).where(Usuario.id.in_(user_ids))
+    )
+    for user_id, avatar_url in avatares:
+        if avatar_url and "cloudinary" in avatar_url:
+            archivos[user_id]['avatar'].append(avatar_url)
     
-    # 2. Archivos de juegos publicados por el usuario
-    juegos = db.query(Juego).filter(Juego.desarrollador_id == user_id).all()
+    # 2. Archivos de juegos publicados (solo las columnas de URLs)
+    juegos = db.execute(
+        select(
+            Juego.desarrollador_id, Juego.id,
+            Juego.portada_url, Juego.screenshots_urls, Juego.trailer_url, Juego.archivo_juego_url
+        )
+        .where(Juego.desarrollador_id.in_(user_ids))
+    )
     
-    for juego in juegos:
+    for user_id, juego_id, portada_url, screenshots_urls, trailer_url, archivo_juego_url in juegos:
+        juegos_ids[user_id].append(juego_id)
+        destino = archivos[user_id]
+        
         # Portada
-        if juego.portada_url and "cloudinary" in juego.portada_url:
-            archivos['juegos_imagenes'].append(juego.portada_url)
+        if portada_url and "cloudinary" in portada_url:
+            destino['juegos_imagenes'].append(portada_url)
         
-        # Screenshots (JSON array)
-        if juego.screenshots_urls:
-            try:
-                screenshots = json.loads(juego.screenshots_urls)
-                for screenshot_url in screenshots:
-                    if "cloudinary" in screenshot_url:
-                        archivos['juegos_imagenes'].append(screenshot_url)
-            except:
-                pass
+        # Screenshots (columna JSON: el engine la decodifica con orjson)
+        for screenshot_url in screenshots_urls or []:
+            if screenshot_url and "cloudinary" in screenshot_url:
+                destino['juegos_imagenes'].append(screenshot_url)
         
         # Trailer
-        if juego.trailer_url and "cloudinary" in juego.trailer_url:
-            archivos['juegos_videos'].append(juego.trailer_url)
+        if trailer_url and "cloudinary" in trailer_url:
+            destino['juegos_videos'].append(trailer_url)
         
         # Archivo del juego
-        if juego.archivo_juego_url and "cloudinary" in juego.archivo_juego_url:
-            archivos['juegos_archivos'].append(juego.archivo_juego_url)
+        if archivo_juego_url and "cloudinary" in archivo_juego_url:
+            destino['juegos_archivos'].append(archivo_juego_url)
     
     # 3. Recibos de compras
-    compras = db.query(Compra).filter(Compra.usuario_id == user_id).all()
-    for compra in compras:
-        if compra.recibo_url and "cloudinary" in compra.recibo_url:
-            archivos['recibos'].append(compra.recibo_url)
+    recibos = db.execute(
+        select(Compra.usuario_id, Compra.recibo_url).where(Compra.usuario_id.in_(user_ids))
+    )
+    for user_id, recibo_url in recibos:
+        if recibo_url and "cloudinary" in recibo_url:
+            archivos[user_id]['recibos'].append(recibo_url)
+    
+    return archivos, juegos_ids
+
+def obtener_archivos_cloudinary_usuario(user_id: int, db) -> Dict[str, List[str]]:
+    """
+    Obtiene todas las URLs de Cloudinary asociadas al usuario
     
-    return archivos
+    Returns:
+        Dict con listas de URLs por tipo de recurso
+    """
+    return obtener_archivos_cloudinary_usuarios([user_id], db)[0][user_id]
 
-def limpiar_cloudinary_usuario(user_id: int, db) -> int:
+def obtener_juegos_ids(user_id: int, db) -> List[int]:
+    """IDs de los juegos publicados por el usuario (sus carpetas en Cloudinary)"""
+    return db.scalars(select(Juego.id).where(Juego.desarrollador_id == user_id)).all()
+
+def limpiar_cloudinary_usuario(archivos: Dict[str, List[str]], juegos_ids: List[int]) -> int:
     """
-    Elimina todos los archivos de Cloudinary del usuario
+    Elimina de Cloudinary los archivos de un usuario y las carpetas de sus juegos
+    No consulta la base de datos: archivos y juegos_ids se obtienen antes de borrar
     
     Returns:
         Número total de archivos eliminados
     """
     print(f"\n☁️  Limpiando archivos de Cloudinary...")
     
-    archivos = obtener_archivos_cloudinary_usuario(user_id, db)
-    total_eliminados = 0
-    
     # Contar totales
     total_archivos = (
         len(archivos['avatar']) +
@@ -267,53 +266,43 @@ def limpiar_cloudinary_usuario(user_id: int, db) -> int:
         print("   ℹ️  No hay archivos en Cloudinary para este usuario")
         return 0
     
-    print(f"   📊 Archivos encontrados en Cloudinary:")
-    print(f"      - Avatar: {len(archivos['avatar'])}")
-    print(f"      - Imágenes de juegos: {len(archivos['juegos_imagenes'])}")
-    print(f"      - Videos de juegos: {len(archivos['juegos_videos'])}")
-    print(f"      - Archivos de juegos: {len(archivos['juegos_archivos'])}")
-    print(f"      - Recibos: {len(archivos['recibos'])}")
-    print(f"      TOTAL: {total_archivos} archivos\n")
-    
-    # Eliminar avatares
-    for url in archivos['avatar']:
-        if delete_cloudinary_resource(url, "image"):
-            total_eliminados += 1
-    
-    # Eliminar imágenes de juegos
-    for url in archivos['juegos_imagenes']:
-        if delete_cloudinary_resource(url, "image"):
-            total_eliminados += 1
-    
-    # Eliminar videos de juegos
-    for url in archivos['juegos_videos']:
-        if delete_cloudinary_resource(url, "video"):
-            total_eliminados += 1
-    
-    # Eliminar archivos de juegos
-    for url in archivos['juegos_archivos']:
-        if delete_cloudinary_resource(url, "raw"):
-            total_eliminados += 1
+    sys.stdout.write(
+        f"   📊 Archivos encontrados en Cloudinary:\n"
+        f"      - Avatar: {len(archivos['avatar'])}\n"
+        f"      - Imágenes de juegos: {len(archivos['juegos_imagenes'])}\n"
+        f"      - Videos de juegos: {len(archivos['juegos_videos'])}\n"
+        f"      - Archivos de juegos: {len(archivos['juegos_archivos'])}\n"
+        f"      - Recibos: {len(archivos['recibos'])}\n"
+        f"      TOTAL: {total_archivos} archivos\n\n"
+    )
     
-    # Eliminar recibos
-    for url in archivos['recibos']:
-        if delete_cloudinary_resource(url, "raw"):
-            total_eliminados += 1
+    # Agrupadas por resource_type para eliminarlas por lotes
+    total_eliminados = delete_cloudinary_resources({
+        "image": archivos['avatar'] + archivos['juegos_imagenes'],
+        "video": archivos['juegos_videos'],
+        "raw": archivos['juegos_archivos'] + archivos['recibos']
+    })
     
     # Eliminar carpetas de juegos del usuario
-    juegos = db.query(Juego).filter(Juego.desarrollador_id == user_id).all()
-    for juego in juegos:
-        folder_path = f"pyxolotl/juegos/{juego.id}"
+    for juego_id in juegos_ids:
+        folder_path = f"pyxolotl/juegos/{juego_id}"
         deleted = delete_cloudinary_folder(folder_path)
         if deleted > 0:
-            print(f"   ✅ Carpeta del juego {juego.id} limpiada: {deleted} archivos")
+            print(f"   ✅ Carpeta del juego {juego_id} limpiada: {deleted} archivos")
     
     return total_eliminados
 
-def eliminar_usuario_completo(user_id: int) -> bool:
-    """Elimina un usuario y TODAS sus relaciones (MySQL + Cloudinary)"""
-    db = SessionLocal()
+def eliminar_usuario_completo(user_id: int, db=None) -> bool:
+    """
+    Elimina un usuario y TODAS sus relaciones (MySQL + Cloudinary)
+    Si se pasa db se usa esa sesión (y no se cierra); si no, abre una propia
+    """
+    sesion_propia = db is None
+    if sesion_propia:
+        db = SessionLocal()
     try:
+        # Sin lock: el resumen y la confirmación no deben bloquear compras, carrito
+        # ni logins del usuario mientras el operador decide
         usuario = db.query(Usuario).filter(Usuario.id == user_id).first()
         
         if not usuario:
@@ -323,9 +312,21 @@ def eliminar_usuario_completo(user_id: int) -> bool:
         # Contar relaciones
         relaciones = contar_relaciones(user_id, db)
         
-        # Obtener archivos de Cloudinary
+        # Obtener archivos de Cloudinary (se eliminan después del commit)
         archivos = obtener_archivos_cloudinary_usuario(user_id, db)
-        total_cloudinary = sum(len(urls) for urls in archivos.values())
+        juegos_ids = obtener_juegos_ids(user_id, db)
+        total_cloudinary = (
+            len(archivos['avatar']) +
+            len(archivos['juegos_imagenes']) +
+            len(archivos['juegos_videos']) +
+            len(archivos['juegos_archivos']) +
+            len(archivos['recibos'])
+        )
+        total_mysql = (
+            relaciones['tokens'] + relaciones['resenas'] + relaciones['compras'] +
+            relaciones['juegos'] + relaciones['carrito'] + relaciones['biblioteca'] +
+            relaciones['descargas']
+        )
         
         # Mostrar información del usuario a eliminar
         print(f"\n⚠️  VAS A ELIMINAR AL SIGUIENTE USUARIO Y TODOS SUS DATOS:")
@@ -342,7 +343,7 @@ def eliminar_usuario_completo(user_id: int) -> bool:
         print(f"   - Items en carrito: {relaciones['carrito']}")
         print(f"   - Items en biblioteca: {relaciones['biblioteca']}")
         print(f"   - Registros de descarga: {relaciones['descargas']}")
-        print(f"   TOTAL MySQL: {sum(relaciones.values())} registros")
+        print(f"   TOTAL MySQL: {total_mysql} registros")
         
         print(f"\n☁️  ARCHIVOS EN CLOUDINARY QUE SE ELIMINARÁN:")
         print(f"   - Avatar: {len(archivos['avatar'])}")
@@ -352,7 +353,7 @@ def eliminar_usuario_completo(user_id: int) -> bool:
         print(f"   - Recibos: {len(archivos['recibos'])}")
         print(f"   TOTAL Cloudinary: {total_cloudinary} archivos")
         
-        print(f"\n💀 TOTAL GENERAL: {sum(relaciones.values()) + total_cloudinary + 1} elementos")
+        print(f"\n💀 TOTAL GENERAL: {total_mysql + total_cloudinary + 1} elementos")
         
         confirmacion = input("\n¿Estás ABSOLUTAMENTE seguro? Escribe 'ELIMINAR TODO' para confirmar: ")
         
@@ -360,54 +361,52 @@ def eliminar_usuario_completo(user_id: int) -> bool:
             print("❌ Operación cancelada")
             return False
         
-        # PASO 1: Eliminar archivos de Cloudinary
-        cloudinary_eliminados = limpiar_cloudinary_usuario(user_id, db)
-        print(f"\n✅ {cloudinary_eliminados} archivos eliminados de Cloudinary")
-        
-        # PASO 2: Eliminar registros de MySQL
+        # PASO 1: Eliminar registros de MySQL (una sola transacción)
         print("\n🗑️  Eliminando registros de MySQL...")
         
-        # 2.1 Tokens
-        if relaciones['tokens'] > 0:
-            db.query(TokenVerificacion).filter(TokenVerificacion.usuario_id == user_id).delete()
-            print(f"   ✅ {relaciones['tokens']} tokens eliminados")
-        
-        # 2.2 Reseñas
-        if relaciones['resenas'] > 0:
-            db.query(Resena).filter(Resena.usuario_id == user_id).delete()
-            print(f"   ✅ {relaciones['resenas']} reseñas eliminadas")
-        
-        # 2.3 Items de carrito
-        if relaciones['carrito'] > 0:
-            db.query(CarritoItem).filter(CarritoItem.usuario_id == user_id).delete()
-            print(f"   ✅ {relaciones['carrito']} items de carrito eliminados")
-        
-        # 2.4 Items de biblioteca
-        if relaciones['biblioteca'] > 0:
-            db.query(BibliotecaItem).filter(BibliotecaItem.usuario_id == user_id).delete()
-            print(f"   ✅ {relaciones['biblioteca']} items de biblioteca eliminados")
-        
-        # 2.5 Registros de descarga
-        if relaciones['descargas'] > 0:
-            db.query(DescargaLog).filter(DescargaLog.usuario_id == user_id).delete()
-            print(f"   ✅ {relaciones['descargas']} registros de descarga eliminados")
-        
-        # 2.6 Compras (con cascade a items_compra)
-        if relaciones['compras'] > 0:
-            db.query(Compra).filter(Compra.usuario_id == user_id).delete()
-            print(f"   ✅ {relaciones['compras']} compras eliminadas")
-        
-        # 2.7 Juegos publicados (con cascade a reseñas, items, etc.)
-        if relaciones['juegos'] > 0:
-            db.query(Juego).filter(Juego.desarrollador_id == user_id).delete()
-            print(f"   ✅ {relaciones['juegos']} juegos eliminados")
-        
-        # 2.8 Finalmente, eliminar el usuario
-        db.delete(usuario)
+        # Nueva transacción con SELECT ... FOR UPDATE justo antes de borrar: desde aquí no
+        # se le pueden agregar compras, juegos, etc., así que conteos y archivos se releen
+        # y coinciden con lo que se borra. El lock dura solo hasta el commit
+        nombre = usuario.nombre
+        db.rollback()
+        if db.query(Usuario.id).filter(Usuario.id == user_id).with_for_update().scalar() is None:
+            print(f"❌ El usuario {user_id} ya no existe")
+            return False
+        relaciones = contar_relaciones(user_id, db)
+        archivos = obtener_archivos_cloudinary_usuario(user_id, db)
+        juegos_ids = obtener_juegos_ids(user_id, db)
+        total_mysql = (
+            relaciones['tokens'] + relaciones['resenas'] + relaciones['compras'] +
+            relaciones['juegos'] + relaciones['carrito'] + relaciones['biblioteca'] +
+            relaciones['descargas']
+        )
+        
+        # Sin autoflush: los DELETE masivos no necesitan sincronizar la sesión antes
+        with db.no_autoflush:
+            # 1.1 Juegos publicados (MySQL borra en cascada sus reseñas, items, etc.)
+            if relaciones['juegos'] > 0:
+                db.query(Juego).filter(Juego.desarrollador_id == user_id).delete(synchronize_session=False)
+            
+            # 1.2 El usuario: tokens, reseñas, carrito, biblioteca, descargas y compras
+            #     (con sus items) caen en cascada (ON DELETE CASCADE)
+            db.query(Usuario).filter(Usuario.id == user_id).delete(synchronize_session=False)
         db.commit()
         
-        print(f"\n✅✅✅ Usuario '{usuario.nombre}' completamente eliminado")
-        print(f"      - MySQL: {sum(relaciones.values()) + 1} registros")
+        print(f"   ✅ {relaciones['tokens']} tokens eliminados")
+        print(f"   ✅ {relaciones['resenas']} reseñas eliminadas")
+        print(f"   ✅ {relaciones['carrito']} items de carrito eliminados")
+        print(f"   ✅ {relaciones['biblioteca']} items de biblioteca eliminados")
+        print(f"   ✅ {relaciones['descargas']} registros de descarga eliminados")
+        print(f"   ✅ {relaciones['compras']} compras eliminadas")
+        print(f"   ✅ {relaciones['juegos']} juegos eliminados")
+        
+        # PASO 2: Eliminar archivos de Cloudinary, ya con los registros borrados:
+        # si algo falla aquí quedan archivos huérfanos, nunca registros sin archivos
+        cloudinary_eliminados = limpiar_cloudinary_usuario(archivos, juegos_ids)
+        print(f"\n✅ {cloudinary_eliminados} archivos eliminados de Cloudinary")
+        
+        print(f"\n✅✅✅ Usuario '{nombre}' completamente eliminado")
+        print(f"      - MySQL: {total_mysql + 1} registros")
         print(f"      - Cloudinary: {cloudinary_eliminados} archivos")
         return True
         
@@ -416,27 +415,27 @@ def eliminar_usuario_completo(user_id: int) -> bool:
         db.rollback()
         return False
     finally:
-        db.close()
+        if sesion_propia:
+            db.close()
 
 def eliminar_usuario_por_email(email: str) -> bool:
     """Elimina un usuario por su email"""
     db = SessionLocal()
     try:
-        usuario = db.query(Usuario).filter(Usuario.email == email).first()
+        # Solo el id: eliminar_usuario_completo carga la fila en la misma sesión
+        user_id = db.query(Usuario.id).filter(Usuario.email == email).scalar()
         
-        if not usuario:
+        if user_id is None:
             print(f"❌ No se encontró ningún usuario con email {email}")
             return False
         
-        db.close()
-        return eliminar_usuario_completo(usuario.id)
+        return eliminar_usuario_completo(user_id, db)
         
     except Exception as e:
         print(f"❌ Error: {e}")
         return False
     finally:
-        if db:
-            db.close()
+        db.close()
 
 def limpiar_usuarios_no_verificados():
     """Elimina todos los usuarios que no han verificado su email"""
@@ -458,23 +457,30 @@ def limpiar_usuarios_no_verificados():
             print("❌ Operación cancelada")
             return
         
-        eliminados = 0
-        for user in usuarios_no_verificados:
-            print(f"\n--- Eliminando: {user.nombre} ---")
-            
-            # Limpiar Cloudinary
-            cloudinary_count = limpiar_cloudinary_usuario(user.id, db)
-            
-            # Eliminar tokens
-            db.query(TokenVerificacion).filter(TokenVerificacion.usuario_id == user.id).delete()
-            
-            # Eliminar usuario
-            db.delete(user)
-            eliminados += 1
-            
-            print(f"✅ Usuario eliminado ({cloudinary_count} archivos de Cloudinary)")
+        ids = [user.id for user in usuarios_no_verificados]
+        
+        # Archivos de todos los usuarios (una consulta por tabla), antes de borrar los registros
+        archivos, juegos_ids = obtener_archivos_cloudinary_usuarios(ids, db)
+        pendientes = [
+            (user.nombre, archivos[user.id], juegos_ids[user.id])
+            for user in usuarios_no_verificados
+        ]
+        
+        # Juegos publicados y usuarios con un DELETE cada uno: tokens y demás
+        # registros caen en cascada (ON DELETE CASCADE)
+        with db.no_autoflush:
+            if any(juegos_ids.values()):
+                db.query(Juego).filter(Juego.desarrollador_id.in_(ids)).delete(synchronize_session=False)
+            eliminados = db.query(Usuario).filter(Usuario.id.in_(ids)).delete(synchronize_session=False)
         
         db.commit()
+        
+        # Limpiar Cloudinary de cada usuario, ya confirmado el borrado
+        for nombre, archivos, juegos_ids in pendientes:
+            print(f"\n--- Limpiando archivos de: {nombre} ---")
+            cloudinary_count = limpiar_cloudinary_usuario(archivos, juegos_ids)
+            print(f"✅ {cloudinary_count} archivos de Cloudinary eliminados")
+        
         print(f"\n✅✅✅ {eliminados} usuarios no verificados eliminados completamente")
         
     except Exception as e:
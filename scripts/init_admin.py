@@ -5,58 +5,189 @@ Ejecutar después del primer deployment
 
 import sys
 import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import re
+import hmac
+import json
+import secrets
+from contextlib import contextmanager
 
-from app.database import SessionLocal
-from app.models import Usuario, TipoCuenta
-from app.utils.security import get_password_hash
-from app.config import settings
+# Agregar el directorio backend al path (ahí vive el paquete app)
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+# Lock con nombre de MySQL: dos ejecuciones simultáneas se forman en lugar de competir
+ADMIN_LOCK = "pyxolotl.init_admin"
+ADMIN_LOCK_TIMEOUT = 30  # segundos
+
+@contextmanager
+def bloqueo_init_admin(conn):
+    """Toma ADMIN_LOCK en la conexión durante el bloque (se libera después del commit)"""
+    from sqlalchemy import text
+    
+    obtenido = conn.execute(
+        text("SELECT GET_LOCK(:nombre, :espera)"),
+        {"nombre": ADMIN_LOCK, "espera": ADMIN_LOCK_TIMEOUT}
+    ).scalar()
+    conn.commit()
+    
+    if obtenido != 1:
+        raise RuntimeError(f"No se pudo obtener el lock {ADMIN_LOCK} en {ADMIN_LOCK_TIMEOUT}s")
+    
+    try:
+        yield
+    finally:
+        conn.execute(text("SELECT RELEASE_LOCK(:nombre)"), {"nombre": ADMIN_LOCK})
+        conn.commit()
+
+# Formato de un hash bcrypt ($2b$12$ + 53 caracteres de sal y hash)
+BCRYPT_HASH_RE = re.compile(r"\$2[aby]\$\d{2}\$[./A-Za-z0-9]{53}")
+
+# Caché de hashes para desarrollo (solo con PYXOLOTL_DEV): evita recalcular bcrypt
+# en cada ejecución con la misma ADMIN_PASSWORD. Guarda el hash, nunca la contraseña
+HASH_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "pyxolotl", "admin_hash.json")
+
+def hash_admin_password(password: str, rounds) -> str:
+    """
+    Hashea la contraseña del administrador
+    En desarrollo reutiliza el hash guardado para la misma contraseña y BCRYPT_ROUNDS.
+    Sin BCRYPT_ROUNDS el costo se calibra en cada arranque, así que no hay con qué
+    comparar el hash guardado y no se usa la caché
+    """
+    if not os.getenv("PYXOLOTL_DEV") or rounds is None:
+        from app.utils.security import get_password_hash
+        return get_password_hash(password)
+    
+    try:
+        with open(HASH_CACHE_PATH, encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    
+    # La clave del HMAC es un secreto aleatorio de esta instalación (guardado en el
+    # mismo archivo 0600), no una constante del código: sin él, la entrada de la caché
+    # no sirve para probar contraseñas por fuerza bruta
+    if not isinstance(cache.get("secreto"), str) or not isinstance(cache.get("hashes"), dict):
+        cache = {"secreto": secrets.token_hex(32), "hashes": {}}
+    
+    clave = hmac.new(bytes.fromhex(cache["secreto"]), password.encode(), "sha256").hexdigest()
+    entrada = cache["hashes"].get(clave)
+    if entrada and entrada.get("rounds") == rounds:
+        return entrada["hash"]
+    
+    from app.utils.security import get_password_hash
+    password_hash = get_password_hash(password)
+    
+    cache["hashes"][clave] = {"rounds": rounds, "hash": password_hash}
+    try:
+        os.makedirs(os.path.dirname(HASH_CACHE_PATH), exist_ok=True)
+        # Solo legible por el dueño: contiene el secreto, el hash y un HMAC de la contraseña
+        fd = os.open(HASH_CACHE_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.fchmod(fd, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+    except OSError:
+        pass
+    
+    return password_hash
 
 def init_admin():
-    db = SessionLocal()
+    # Imports locales: importar el script no crea el engine ni carga los modelos
+    from sqlalchemy import select, insert, update
+    from sqlalchemy.exc import IntegrityError
+    
+    from app.database import engine
+    from app.models import Usuario, TipoCuenta
+    from app.config import settings
+    
+    # Un hash mal copiado crearía un administrador que nunca puede iniciar sesión
+    if settings.ADMIN_PASSWORD_HASH and not BCRYPT_HASH_RE.fullmatch(settings.ADMIN_PASSWORD_HASH):
+        sys.exit("❌ Error: ADMIN_PASSWORD_HASH no es un hash bcrypt válido")
     
     try:
-        # Buscar si ya existe el usuario con ese email
-        admin_user = db.query(Usuario).filter(
-            Usuario.email == settings.ADMIN_EMAIL
-        ).first()
-        
-        if admin_user:
-            # Usuario existe, promocionar a admin si no lo es
-            if admin_user.tipo_cuenta != TipoCuenta.ADMINISTRADOR:
-                admin_user.tipo_cuenta = TipoCuenta.ADMINISTRADOR
-                admin_user.verificado = True
-                db.commit()
-                print(f"✅ Usuario {settings.ADMIN_EMAIL} promocionado a administrador")
-            else:
-                print(f"ℹ️  Usuario {settings.ADMIN_EMAIL} ya es administrador")
-        
-        else:
-            # Crear nuevo usuario administrador
-            new_admin = Usuario(
-                nombre="Administrador",
-                email=settings.ADMIN_EMAIL,
-                password_hash=get_password_hash(settings.ADMIN_PASSWORD),
-                tipo_cuenta=TipoCuenta.ADMINISTRADOR,
-                verificado=True
-            )
+        # Solo sentencias Core sobre una conexión (sin Session ni unidad de trabajo del ORM)
+        # y una sola transacción: se confirma al salir del bloque
+        # (o se revierte si hay una excepción). El lock se toma antes de consultar,
+        # así una segunda ejecución espera y ya ve al administrador creado
+        with engine.connect() as conn, bloqueo_init_admin(conn), conn.begin():
+            # Buscar si ya existe el usuario con ese email (solo las columnas necesarias)
+            admin_user = conn.execute(
+                select(Usuario.id, Usuario.tipo_cuenta, Usuario.verificado)
+                .where(Usuario.email == settings.ADMIN_EMAIL)
+            ).first()
             
-            db.add(new_admin)
-            db.commit()
+            if admin_user:
+                # Usuario existe, promocionar a admin si no lo es; la contraseña no se toca
+                # (ADMIN_PASSWORD solo se usa al crearlo)
+                if admin_user.tipo_cuenta != TipoCuenta.ADMINISTRADOR or not admin_user.verificado:
+                    conn.execute(
+                        update(Usuario)
+                        .where(Usuario.id == admin_user.id)
+                        .values(tipo_cuenta=TipoCuenta.ADMINISTRADOR, verificado=True)
+                    )
+                    print(f"✅ Usuario {settings.ADMIN_EMAIL} promocionado a administrador")
+                else:
+                    print(f"ℹ️  Usuario {settings.ADMIN_EMAIL} ya es administrador")
             
-            print(f"✅ Usuario administrador creado:")
-            print(f"   Email: {settings.ADMIN_EMAIL}")
-            print(f"   Password: {settings.ADMIN_PASSWORD}")
-            print(f"   ⚠️  CAMBIA LA CONTRASEÑA DESPUÉS DEL PRIMER LOGIN")
+            else:
+                # Crear nuevo usuario administrador. El SELECT de arriba ya corrió bajo el
+                # lock, pero un registro normal con ese email puede colarse antes del INSERT:
+                # el INSERT va en un SAVEPOINT y, si choca con el email único, se promociona
+                # al usuario existente. Así "creado" y "promocionado" no dependen del rowcount
+                # Con ADMIN_PASSWORD_HASH no hace falta hashear (hash_admin_password importa
+                # app.utils.security, que carga bcrypt y calibra su costo, solo si lo necesita)
+                password_hash = settings.ADMIN_PASSWORD_HASH or hash_admin_password(
+                    settings.ADMIN_PASSWORD, settings.BCRYPT_ROUNDS
+                )
+                
+                try:
+                    with conn.begin_nested():
+                        conn.execute(
+                            insert(Usuario).values(
+                                nombre="Administrador",
+                                email=settings.ADMIN_EMAIL,
+                                password_hash=password_hash,
+                                tipo_cuenta=TipoCuenta.ADMINISTRADOR,
+                                verificado=True
+                            )
+                        )
+                except IntegrityError:
+                    conn.execute(
+                        update(Usuario)
+                        .where(Usuario.email == settings.ADMIN_EMAIL)
+                        .values(tipo_cuenta=TipoCuenta.ADMINISTRADOR, verificado=True)
+                    )
+                    print(f"✅ Usuario {settings.ADMIN_EMAIL} promocionado a administrador")
+                else:
+                    password = "(la de ADMIN_PASSWORD_HASH)" if settings.ADMIN_PASSWORD_HASH else settings.ADMIN_PASSWORD
+                    sys.stdout.write(
+                        f"✅ Usuario administrador creado:\n"
+                        f"   Email: {settings.ADMIN_EMAIL}\n"
+                        f"   Password: {password}\n"
+                        f"   ⚠️  CAMBIA LA CONTRASEÑA DESPUÉS DEL PRIMER LOGIN\n"
+                    )
     
     except Exception as e:
         print(f"❌ Error: {str(e)}")
-        db.rollback()
+
+def sugerir_bcrypt_rounds():
+    """
+    Muestra el costo de bcrypt calibrado para este equipo (solo con --calibrar)
+    Sin BCRYPT_ROUNDS, cada arranque del backend vuelve a medirlo (y puede variar entre
+    instancias); fijarlo en las variables de entorno deja un costo estable
+    """
+    from app.config import settings
     
-    finally:
-        db.close()
+    if settings.BCRYPT_ROUNDS:
+        print(f"ℹ️  BCRYPT_ROUNDS ya está fijo en {settings.BCRYPT_ROUNDS}")
+        return
+    
+    # Importar app.utils.security calibra el costo (una sola vez por proceso)
+    from app.utils.security import BCRYPT_ROUNDS
+    print(f"💡 Costo de bcrypt para este equipo (≤ {settings.BCRYPT_TARGET_MS} ms por hash): "
+          f"define BCRYPT_ROUNDS={BCRYPT_ROUNDS} para fijarlo")
 
 if __name__ == "__main__":
     print("🚀 Inicializando administrador...")
     init_admin()
+    if "--calibrar" in sys.argv[1:]:
+        sugerir_bcrypt_rounds()
     print("✨ Proceso completado")